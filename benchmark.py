@@ -0,0 +1,449 @@
+"""Micro-benchmarks for the CV pipeline on a large synthetic CV, eg. `python benchmark.py build_variant --entries 500`."""
+import argparse
+import contextlib
+import io
+import logging
+import os
+import re
+import tempfile
+import time
+import types
+from itertools import chain, permutations
+
+import yaml
+
+from build_latex import CV2LaTeX
+from cv_builder import CVBuilder, IR_CACHE, SECTION_CACHE, Translator, tokenize
+from util.cache import FileCache, Snapshots
+
+BENCHMARKS = {}
+
+
+def benchmark(fn):
+    BENCHMARKS[fn.__name__] = fn
+    return fn
+
+
+def synthetic_cv(n_entries=200, extra_dims=0):
+    """A CV using all features of the YAML-syntax (postfixes, brackets, show_on, design-hints, dates, links, ...).
+       `extra_dims` adds further variant-categories (with keys like `title_de_lg_a1`) on top of language/length/cat."""
+    extra = {f"dim{d}": {f"a{d}": {"name": f"A{d}", "default": True}, f"b{d}": {"name": f"B{d}"}} for d in range(extra_dims)}
+    entries = [{"time": f"date(20{i % 20:02d}-01-{i % 28 + 1:02d}) - 2020",
+                "title": f"Hiwi job {i}", "title_de": f"Hiwi Stelle {i}", "title_lg_nontech": f"Hiwi position number {i}",
+                "employer": "University", "place": "Osnabrück, Germany", "hp_link": f"/jobs/{i}",
+                "website": "[example.org](https://example.org)",
+                "optlong": 'I did **cool** things, see [here](https://example.com/x). The thesis is enclosed. "Quoted" stuff.\\n* item a\\n* item b',
+                "optlong_lg": "Long version: I did *many* things at e.g. the Uni. Ph.D. students helped. Certificate handed in. See www.example.com.",
+                "optlong_de_lg": "Lange Version, mit [Link](/foo).",
+                **{f"title_de_lg_{'ab'[i % 2]}{d}": f"Hiwi Stelle {i} ({d})" for d in range(extra_dims)},
+                **{f"optlong_{'ab'[i % 2]}{d}_nontech": f"Variant text {i} ({d})" for d in range(extra_dims)},
+                **({"show_on": "de"} if i % 7 == 0 else {})}
+               for i in range(n_entries)]
+    return {
+        "variants": {"language": {"en": {"name": "English", "default": True, "datefmt": "%m/%d/%Y"},
+                                  "de": {"name": "Deutsch", "datefmt": "%d.%m.%Y"}},
+                     "length": {"sh": {"name": "Short", "default": True}, "lg": {"name": "Long"}},
+                     "cat": {"tech": {"name": "Tech", "default": True}, "nontech": {"name": "Non-Tech"}}, **extra},
+        "translations": {"en": {"Hiwi": "Student research assistant", "Lebenslauf": "Curriculum Vitae"},
+                         "de": {"Hiwi": "Studentische Hilfskraft"}},
+        "Basic Info": {"firstname": "John", "familyname": "Doe", "title": "Lebenslauf", "photo": "img(your_picture)",
+                       "homepage": "example.com", "city": "Berlin"},
+        "Personal Information": {"Date of birth": "date(1999-12-31)"},
+        "Education": entries[:n_entries // 4],
+        "Vocational Experience": entries[n_entries // 4:],
+        "Programming Languages and Computer Skills [en] {paragraphs}": ["I write **Python**, see [here](/code)."] * 5,
+        "Programmiersprachen und -kompetenzen [de]": ["Das selbe in grün"],
+        "Awards, Certificates and Stipends [en, lg] {yearlist}": {str(2000 + i): f"Certificate {i}" for i in range(20)},
+        "Natural Languages [en]": {"English": ["fluent", "[en] Bachelor and Jobs", "[de] Studium und Berufe"], "German": ["native"]},
+        "Natürliche Sprachen [de]": {"Englisch": ["fließend"]},
+        "Hobbies and Interests [en]": ["Programming CVs", "[lg] Other things, I swear"],
+    }
+
+
+def count_nodes(obj):
+    if isinstance(obj, dict):
+        return 1 + sum(count_nodes(k) + count_nodes(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set)):
+        return 1 + sum(count_nodes(i) for i in obj)
+    return 1
+
+
+def all_strings(obj):
+    if isinstance(obj, dict):
+        return [j for k, v in obj.items() for j in all_strings(k) + all_strings(v)]
+    if isinstance(obj, (list, tuple, set)):
+        return [j for i in obj for j in all_strings(i)]
+    return [obj] if isinstance(obj, str) else []
+
+
+def timeit(fn, repeat):
+    """best-of-`repeat` runtime in seconds, with stdout swallowed"""
+    times = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            tic = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - tic)
+    return min(times)
+
+
+@benchmark
+def cold_load(path, repeat):
+    """loading the YAML in a new process (ie. with an empty cache): with the pure-Python SafeLoader, with libyaml's
+       CSafeLoader, and from the pickled snapshot"""
+    loaders = {"SafeLoader": yaml.SafeLoader, **({"CSafeLoader": yaml.CSafeLoader} if yaml.__with_libyaml__ else {})}
+    print(f"YAML of {os.path.getsize(path) // 1024}kB")
+    for name, loader in loaders.items():
+        parse = lambda raw: yaml.load(raw, Loader=loader)
+        secs = timeit(lambda: FileCache(parse).get(path), repeat)
+        print(f"cold load with {name}: {secs*1000:.1f}ms")
+    snapshots = Snapshots(os.path.join(os.path.dirname(path), "snapshots"))
+    FileCache(parse, snapshots=snapshots).get(path)  # (writes the snapshot)
+    secs = timeit(lambda: FileCache(parse, snapshots=snapshots).get(path), repeat)
+    print(f"cold load from the snapshot: {secs*1000:.1f}ms ({os.path.getsize(snapshots.path(path)) // 1024}kB)")
+
+@benchmark
+def build_variant(path, repeat):
+    builder = CVBuilder(path)
+    nodes = count_nodes(builder.yaml)
+    for variant in [dict(language="en"), dict(language="de", length="lg", cat="nontech")]:
+        secs = timeit(lambda: builder.build_variant(**variant), repeat)
+        print(f"build_variant({variant}): {secs*1000:.1f}ms, {secs/nodes*1e6:.2f}µs/node ({nodes} nodes)")
+
+
+@benchmark
+def projection(path, repeat):
+    """compiling the sections of the YAML, and building variants from the compiled sections (without section-cache)"""
+    builder = CVBuilder(path)
+    keys = [k for k in builder.yaml if k not in ["variants", "translations"]]
+    def compile_all():
+        IR_CACHE.clear()
+        return [builder.compile_section(k) for k in keys]
+    secs = timeit(compile_all, repeat)
+    print(f"compile all sections: {secs*1000:.1f}ms")
+    for variant in [dict(language="en"), dict(language="de", length="lg", cat="nontech")]:
+        def build():
+            SECTION_CACHE.clear()
+            return builder.build_variant(**variant)
+        secs = timeit(build, repeat)
+        print(f"build_variant({variant}) from the compiled sections: {secs*1000:.1f}ms")
+
+def all_dicts(obj):
+    if isinstance(obj, dict):
+        return [obj] + [j for v in obj.values() for j in all_dicts(v)]
+    if isinstance(obj, (list, tuple)):
+        return [j for i in obj for j in all_dicts(i)]
+    return []
+
+
+def former_select_keys(builder, di, variant):
+    """the key-selection of CVBuilder.handle_subdict before the per-variant lookup-table: the permutations of the variant
+       and the loops over postfixes x keys for every dict (reference for `postfixes`)"""
+    used_postfixes = ["_"+"_".join(i) for i in sorted(chain.from_iterable(permutations(variant.values(), i) for i in range(1, len(variant)+1)), key=len, reverse=True)]
+    varianted_keys = variant_basekeys = {k for k in di.keys() if any(i in k for i in used_postfixes)}
+    for pf in builder.all_postfixes():
+        variant_basekeys = {i.removesuffix(f"_{pf}")for i in variant_basekeys}
+    basekeys2 = {i for i in variant_basekeys}
+    used_variants = {}
+    for pf in used_postfixes:
+        for var in varianted_keys:
+            if var.endswith(pf) and var.removesuffix(pf) in variant_basekeys:
+                variant_basekeys.remove(var.removesuffix(pf))
+                used_variants[var] = var.removesuffix(pf)
+    return {used_variants.get(k, k): v for k, v in di.items() if ((not any(k.endswith("_"+i) for i in builder.all_postfixes()) and k not in basekeys2) or k in used_variants) and v}
+
+
+@benchmark
+def postfixes(path, repeat):
+    """key-resolution with more variant-categories, where the number of postfix-permutations explodes: only the former
+       key-selection of every dict, and the complete build_variant now (compiling the sections included, no caches)"""
+    for extra_dims in [0, 1, 2]:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "cv.yaml")
+            with open(path, "w") as wfile:
+                yaml.safe_dump(synthetic_cv(200, extra_dims=extra_dims), wfile, sort_keys=False, allow_unicode=True)
+            builder = CVBuilder(path)
+            variant = dict(language="de", length="lg", cat="nontech", **{f"dim{d}": f"b{d}" for d in range(extra_dims)})
+            dicts = [j for k, v in builder.yaml.items() if k not in ["variants", "translations"] for j in all_dicts(v)]
+            secs = timeit(lambda: [former_select_keys(builder, i, variant) for i in dicts], repeat)
+            print(f"former key-selection with {3 + extra_dims} variant-categories: {secs*1000:.1f}ms ({len(dicts)} dicts)")
+            secs = timeit(lambda: (IR_CACHE.clear(), SECTION_CACHE.clear(), builder.build_variant(**variant)), repeat)
+            print(f"build_variant with {3 + extra_dims} variant-categories: {secs*1000:.1f}ms")
+
+
+@benchmark
+def tokenizer(path, repeat):
+    """scanning every key & value of the YAML: with the former separate regex-calls, and with the single TOKEN_RE pass"""
+    strings = all_strings(CVBuilder(path).yaml)
+    secs = timeit(lambda: [regex_scan(i) for i in strings], repeat)
+    print(f"separate regex-calls (former): {secs*1000:.1f}ms, {secs/len(strings)*1e6:.2f}µs/string ({len(strings)} strings)")
+    secs = timeit(lambda: [tokenize.__wrapped__(i) for i in strings], repeat)
+    print(f"tokenize (uncached): {secs*1000:.1f}ms, {secs/len(strings)*1e6:.2f}µs/string ({len(strings)} strings)")
+    secs = timeit(lambda: [tokenize(i) for i in strings], repeat)
+    print(f"tokenize (cached): {secs*1000:.1f}ms, {secs/len(strings)*1e6:.2f}µs/string ({len(strings)} strings)")
+
+
+def former_wordwise_translate(translations, what, tolang):
+    """CVBuilder.wordwise_translate before the Translator: a dict-lookup per space-separated word, so words before
+       other punctuation than `:`, `{` and `,` weren't translated (reference for `translate`)"""
+    transl = translations[tolang]
+    what = what.replace(":", " :").replace("{", " {").replace(",", " ,")
+    what = " ".join([transl.get(i, i) for i in what.split(" ")])
+    return what.replace(" :", ":").replace(" {", "{").replace(" ,", ",")
+
+
+@benchmark
+def translate(path, repeat):
+    """all keys & values of the YAML word-wise into every language: with the former loop, with a new Translator (so
+       including compiling its pattern) and with an already filled memo"""
+    builder = CVBuilder(path)
+    strings = all_strings(builder.yaml)
+    def cold(lang):
+        translator = Translator(builder.translations)
+        return [translator.translate(i, lang) for i in strings]
+
+    for lang in builder.translations:
+        warm = Translator(builder.translations)  # (not the builder's, whose memo is shared with the other benchmarks)
+        for i in strings:
+            warm.translate(i, lang)
+        for name, fn in [("former word-wise loop", lambda: [former_wordwise_translate(builder.translations, i, lang) for i in strings]),
+                         ("Translator, cold", lambda: cold(lang)), ("Translator, memoized", lambda: [warm.translate(i, lang) for i in strings])]:
+            secs = timeit(fn, repeat)
+            print(f"translate to {lang} ({name}): {secs*1000:.1f}ms, {secs/len(strings)*1e6:.2f}µs/string ({len(strings)} strings)")
+
+
+@benchmark
+def incremental(path, repeat):
+    """build_variant after editing a single section of the YAML, with and without the per-section cache"""
+    cv = yaml.safe_load(open(path))
+    variant = dict(language="de", length="lg", cat="nontech")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "cv.yaml")
+        for cached in [False, True]:
+            times = []
+            for i in range(repeat + 1):
+                cv["Hobbies and Interests [en]"][0] = f"Programming CVs, edit #{i}"
+                with open(path, "w") as wfile:
+                    yaml.safe_dump(cv, wfile, sort_keys=False, allow_unicode=True)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    builder = CVBuilder(path)  # (re-parsing the YAML isn't part of the measurement)
+                if not cached:
+                    SECTION_CACHE.clear()
+                times.append(timeit(lambda: builder.build_variant(**variant), 1))
+            print(f"build_variant after editing one section ({'with' if cached else 'without'} section-cache): {min(times[1:])*1000:.1f}ms")
+
+
+class FormerCV2LaTeX(CV2LaTeX):
+    """the text formatting of CV2LaTeX before the single-scan conversion (chained re.subs & replaces and a
+       char-by-char quote loop), as reference for `latex_text`"""
+
+    def _smart_quotes(self, t):
+        out = []
+        openq = True
+        i = 0
+        while i < len(t):
+            c = t[i]
+            if c == '"' and (i == 0 or t[i-1] != "\\"):
+                out.append("``" if openq else "''")
+                openq = not openq
+            else:
+                out.append(c)
+            i += 1
+        return "".join(out)
+
+    def _fmt_text(self, s):
+        t = str(s or "").replace("\\n", "\n")
+        if re.search(r"(?ms)^[ \t]*\* [^\n]+\n[ \t]*\* [^\n]+", t):
+            res = self._render_bullet_blocks(t)
+        else:
+            res = self._fmt_inline(t)
+        res = re.sub(r'(?<!\\)\\n', r'\\\\', res)
+        res = res.replace("\\\\small", "\\small")
+        res = re.sub(r'(?<!\})\n(?!\\item|\\end\{itemize\})', r'\\\\', res)
+        res = re.sub(r'(?:\\\\\s*)+(?=\\item\b)', '', res)
+        res = re.sub(r'(?:\\\\\s*)+(?=\\begin\{itemize\b)', '', res)
+        return res
+
+    def _fmt_inline(self, s):
+        t = str(s or "")
+        t = re.sub(r"\[([^\]]+)\]\(([^)]+)\)", lambda m: "\\httplink[%s]{%s}" % (m.group(1), self._esc_url(self._abs_url(m.group(2)))), t)
+        t = re.sub(r"(?<!\*)\*\*(.+?)\*\*(?!\*)", r"\\bo{\1}", t, flags=re.S)
+        t = re.sub(r"(?<!\*)\*(.+?)\*(?!\*)", r"\\textit{\1}", t, flags=re.S)
+        t = self._smart_quotes(t)
+        t = (t.replace("•", r"\textbullet{}")
+             .replace("<br>", " \\\\ ")
+             .replace("<br/>", " \\\\ ")
+             .replace("<br />", " \\\\ "))
+        return self._esc(t)
+
+    def _render_bullet_blocks(self, t):
+        pat = re.compile(r"(?ms)^([ \t]*\* [^\n]+(?:\n[ \t]*\* [^\n]+)+)")
+        out, i = [], 0
+        for m in pat.finditer(t):
+            pre = t[i:m.start()]
+            if pre:
+                pre_fmt = self._fmt_inline(pre)
+                pre_fmt = re.sub(r'(?:\s*\\\\\s*)+$', '', pre_fmt)
+                out.append(pre_fmt.rstrip())
+            block = m.group(1).strip("\n")
+            lines = [re.sub(r"^[ \t]*\* ?", "", ln) for ln in block.split("\n")]
+            items = []
+            for ln in lines:
+                item_txt = self._fmt_inline(ln)
+                item_txt = re.sub(r'(?:\s*\\\\\s*)+$', '', item_txt)
+                items.append("\t\\item %s" % item_txt)
+            out.append("\n\\begin{itemize}\n\\setlength\\itemsep{0pt}\\setlength\\parsep{0pt}\\setlength\\parskip{0pt}\n%s\n\\end{itemize}" % "\n".join(items))
+            i = m.end()
+        tail = t[i:]
+        if tail:
+            tail_fmt = self._fmt_inline(tail)
+            tail_fmt = re.sub(r'(?:\s*\\\\\s*)+$', '', tail_fmt)
+            out.append(tail_fmt)
+        return self._clean_itemize_glue("".join(out))
+
+    def _clean_itemize_glue(self, t):
+        t = re.sub(r'\\par\s*\\\\\s*(\\begin\{itemize\})', r'\\par\n\1', t)
+        t = re.sub(r'(\\begin\{itemize\})\s*\\\\', r'\1\n', t)
+        t = re.sub(r'\\\\\s*(\\end\{itemize\})', r'\n\1', t)
+        t = re.sub(r'(\n?\s*\\item\b[^\n]*?)\s*\\\\(?=\s*(\\item|\\end\{itemize\}))', r'\1', t, flags=re.S)
+        return t
+
+    def _esc(self, s):
+        t = str(s or "")
+        if "\\" in t:
+            return t
+        t = re.sub(r"([%&#_$\{\}])", r"\\\1", t)
+        return t.replace("^", "\\textasciicircum{}").replace("~", "\\textasciitilde{}")
+
+
+@benchmark
+def latex_text(path, repeat):
+    """CV2LaTeX._fmt_text on long optlong-bodies (with lists, links, bold, quotes) and on all other texts, with the
+       former and the current formatter"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        cvs = [CVBuilder(path).build_variant(language="en", length=length, annotate_kind=False) for length in ["sh", "lg"]]
+    bodies = [i["optlong"] * 10 for cv in cvs for i in cv["Vocational Experience"] if i.get("optlong")]
+    strings = [j for cv in cvs for j in all_strings(cv)]
+    for name, texts in [("optlong-bodies (10x)", bodies), ("all texts", strings)]:
+        for impl in [FormerCV2LaTeX, CV2LaTeX]:
+            converter = impl(cvs[0], "", site_base="https://example.org")
+            secs = timeit(lambda: [converter._fmt_text(i) for i in texts], repeat)
+            print(f"{impl.__name__}._fmt_text on {name}: {secs*1000:.1f}ms, {secs/len(texts)*1e6:.2f}µs/text ({len(texts)} texts, {sum(map(len, texts))//len(texts)} chars avg)")
+
+
+@benchmark
+def log_level(path, repeat):
+    """build_variant per request (sections cached) with LOG_LEVEL=DEBUG, which formats the whole CV like the former
+       pprint did, and with INFO, where that's skipped"""
+    builder = CVBuilder(path)
+    logger = logging.getLogger("cv_builder")
+    handler = logging.StreamHandler(io.StringIO())
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        for level in ["DEBUG", "INFO"]:
+            logger.setLevel(level)
+            secs = timeit(lambda: builder.build_variant(language="en"), repeat)
+            print(f"build_variant with LOG_LEVEL={level}: {secs*1000:.1f}ms")
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(logging.NOTSET)
+        logger.propagate = True
+
+
+@benchmark
+def html_render(path, repeat):
+    """the HTML of all 8 variants (sections built already): markdown.markdown per text vs. the pooled Markdown-engine,
+       and then with the inline_edit-memo (which the server keeps between variants and requests)"""
+    import markdown
+    import jinja_cv_html
+    import serve
+    from util.transform import Pipeline
+    builder = CVBuilder(path)
+    variants = [dict(language=l, length=le, cat=c) for l in ["en", "de"] for le in ["sh", "lg"] for c in ["tech", "nontech"]]
+    engine, memoized, pipeline = jinja_cv_html.markdown_engine, serve.inline_edit, serve.HTML_PIPELINE
+    def render_all():
+        memoized.cache_clear()
+        for variant in variants:
+            serve.SECTION_HTML_CACHE.clear()
+            serve.render_cv(builder, variant)
+    fresh = lambda: types.SimpleNamespace(convert=markdown.markdown)  # (a new instance for every text, as before)
+    for name, md, fn in [("markdown.markdown per text", fresh, memoized.__wrapped__), ("pooled Markdown-engine", engine, memoized.__wrapped__),
+                         ("pooled + inline_edit-memo", engine, memoized)]:
+        jinja_cv_html.markdown_engine, serve.HTML_PIPELINE = md, Pipeline(leaf=[fn])
+        secs = timeit(render_all, repeat)
+        print(f"render_cv of {len(variants)} variants, {name}: {secs*1000:.1f}ms")
+    jinja_cv_html.markdown_engine, serve.HTML_PIPELINE = engine, pipeline
+
+def former_split_into_sentences(text):
+    """split_into_sentences before the single-pass rewrite: the substitutions of https://stackoverflow.com/a/31505798
+       one after another, marking full stops as `<prd>` and sentence-ends as `<stop>` (reference for `sentences`)"""
+    alphabets, suffixes, digits = "([A-Za-z])", "(Inc|Ltd|Jr|Sr|Co)", "([0-9])"
+    starters = r"(Mr|Mrs|Ms|Dr|Prof|Capt|Cpt|Lt|He\s|She\s|It\s|They\s|Their\s|Our\s|We\s|But\s|However\s|That\s|This\s|Wherever|www)"
+    text = " " + text + "  "
+    text = text.replace("\n", " ")
+    text = re.sub("(Mr|St|Mrs|Ms|Dr)[.]", "\\1<prd>", text)
+    text = re.sub("[.](com|net|org|io|gov|edu|me|de)", "<prd>\\1", text)
+    text = re.sub(digits + "[.]" + digits, "\\1<prd>\\2", text)
+    text = re.sub(r"\.{2,}", lambda match: "<prd>" * len(match.group(0)) + "<stop>", text)
+    if "Ph.D" in text: text = text.replace("Ph.D.", "Ph<prd>D<prd>")
+    text = re.sub(r"\s" + alphabets + "[.] ", " \\1<prd> ", text)
+    text = re.sub("([A-Z][.][A-Z][.](?:[A-Z][.])?) " + starters, "\\1<stop> \\2", text)
+    text = re.sub(alphabets + "[.]" + alphabets + "[.]" + alphabets + "[.]", "\\1<prd>\\2<prd>\\3<prd>", text)
+    text = re.sub(alphabets + "[.]" + alphabets + "[.]", "\\1<prd>\\2<prd>", text)
+    text = re.sub(" " + suffixes + "[.] " + starters, " \\1<stop> \\2", text)
+    text = re.sub(" " + suffixes + "[.]", " \\1<prd>", text)
+    text = re.sub(" " + alphabets + "[.]", " \\1<prd>", text)
+    if "”" in text: text = text.replace(".”", "”.")
+    if "\"" in text: text = text.replace(".\"", "\".")
+    if "!" in text: text = text.replace("!\"", "\"!")
+    if "?" in text: text = text.replace("?\"", "\"?")
+    text = text.replace(".", ".<stop>").replace("?", "?<stop>").replace("!", "!<stop>").replace("<prd>", ".")
+    sentences = [s.strip() for s in text.split("<stop>")]
+    if sentences and not sentences[-1]: sentences = sentences[:-1]
+    return sentences
+
+
+def former_remove_forbidtexts(txt):
+    """remove_forbidtexts before the rewrite: split & join the text once per forbidden phrase"""
+    for forbid_txt in ["enclosed", "handed in"]:
+        if forbid_txt in txt:
+            txt = " ".join([i if not forbid_txt in i else "".join([j.group() for j in re.finditer(r"<(.*?)>", i) if j]) for i in former_split_into_sentences(txt)])
+            txt = txt.replace("www. ", "www.")
+            txt = txt.rstrip("*").rstrip()
+    return txt
+
+
+@benchmark
+def sentences(path, repeat):
+    """split_into_sentences and remove_forbidtexts on long optlong-bodies (as HTML, like in inline_edit), with the
+       former multi-pass substitutions and the current implementation"""
+    from jinja_cv_html import remove_forbidtexts
+    from util.text_util import split_into_sentences
+    with contextlib.redirect_stdout(io.StringIO()):
+        cvs = [CVBuilder(path).build_variant(language="en", length=length, annotate_kind=False) for length in ["sh", "lg"]]
+    bodies = [i["optlong"] * 10 for cv in cvs for i in cv["Vocational Experience"] if i.get("optlong")]
+    for name, fn in [("former split_into_sentences", former_split_into_sentences), ("split_into_sentences", split_into_sentences),
+                     ("former remove_forbidtexts", former_remove_forbidtexts), ("remove_forbidtexts", remove_forbidtexts)]:
+        secs = timeit(lambda: [fn(i) for i in bodies], repeat)
+        print(f"{name} on optlong-bodies (10x): {secs*1000:.1f}ms, {secs/len(bodies)*1e6:.1f}µs/body ({len(bodies)} bodies, {sum(map(len, bodies))//len(bodies)} chars avg)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("what", nargs="*", help=f"benchmarks to run, out of {', '.join(BENCHMARKS)} (default: all)")
+    ap.add_argument("--entries", type=int, default=500, help="number of CV-entries of the synthetic CV")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    if unknown := set(args.what) - set(BENCHMARKS):
+        ap.error(f"unknown benchmarks: {', '.join(unknown)}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "cv.yaml")
+        with open(path, "w") as wfile:
+            yaml.safe_dump(synthetic_cv(args.entries), wfile, sort_keys=False, allow_unicode=True)
+        for name in args.what or BENCHMARKS:
+            BENCHMARKS[name](path, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,106 @@
-from components.cv_builder.jinja_cv_html import remove_forbidtexts, SECTIONTRANSLATE
+from jinja_cv_html import remove_forbidtexts, SECTIONTRANSLATE
 from cv_builder import CVBuilder
-import re, json, argparse, pathlib
+from util.cache import LRUCache, content_hash
+from util.transform import Pipeline
+import re, json, argparse, pathlib, itertools, hashlib, os, shutil, subprocess
+from os.path import basename, dirname, join, splitext
 from typing import Any, Dict, List
 
+TEX_TEMPLATE_PATH = join(dirname(__file__), "static", "cv_template.tex")
+SECTION_CACHE = LRUCache(maxsize=512)  # (section name, content hash, settings) -> LaTeX chunk of that section
+
+# the markdown-subset of the texts, see CV2LaTeX._fmt_inline. The leading lookaheads (`(?=[..])`) let the regex-engine
+# skip to candidate characters quickly instead of trying every alternative at every position.
+MD_LINK_RE = re.compile(r"\[([^\]]+)\]\(([^)]+)\)")
+BOLD_RE = re.compile(r"(?=\*)(?<!\*)\*\*(.+?)\*\*(?!\*)", re.S)
+ITALIC_RE = re.compile(r"(?=\*)(?<!\*)\*(.+?)\*(?!\*)", re.S)
+BR_RE = re.compile(r"<br>|<br/>|<br />")
+INLINE_RE = re.compile(r'(?=[\["•<])(?:(?P<link>\[(?P<text>[^\]]+)\]\((?P<url>[^)]+)\))|(?P<quote>(?<!\\)")|(?P<bullet>•)|(?P<br><br>|<br/>|<br />))')
+INLINE_NOLINK_RE = re.compile(r'(?=["•<])(?:(?P<quote>(?<!\\)")|(?P<bullet>•)|(?P<br><br>|<br/>|<br />))')  # for already converted links
+ESC_RE = re.compile(r"[%&#_${}^~]")
+PLAIN_RE = re.compile(r'(?=["%&#_${}^~])(?:(?P<quote>")|(?P<esc>[%&#_${}^~]))')
+LATEX_ESCAPES = {**{c: "\\" + c for c in "%&#_${}"}, "^": "\\textasciicircum{}", "~": "\\textasciitilde{}"}
+# line-breaks & lists, see CV2LaTeX._fmt_text
+BULLETS_RE = re.compile(r"(?ms)^[ \t]*\* [^\n]+\n[ \t]*\* [^\n]+")
+BULLET_BLOCK_RE = re.compile(r"(?ms)^([ \t]*\* [^\n]+(?:\n[ \t]*\* [^\n]+)+)")
+BULLET_MARKER_RE = re.compile(r"^[ \t]*\* ?")
+TRAILING_BREAKS_RE = re.compile(r'(?:\s*\\\\\s*)+$')
+LITERAL_NEWLINE_RE = re.compile(r'(?<!\\)\\n')
+NEWLINE_RE = re.compile(r'(?=\n)(?<!\})\n(?!\\item|\\end\{itemize\})')
+BREAKS_BEFORE_ITEM_RE = re.compile(r'(?=\\\\)(?:\\\\\s*)+(?=\\item\b)')
+BREAKS_BEFORE_ITEMIZE_RE = re.compile(r'(?=\\\\)(?:\\\\\s*)+(?=\\begin\{itemize\b)')
+ITEMIZE_GLUE_RES = [(re.compile(r'\\par\s*\\\\\s*(\\begin\{itemize\})'), r'\\par\n\1'),
+                    (re.compile(r'(\\begin\{itemize\})\s*\\\\'), r'\1\n'),
+                    (re.compile(r'\\\\\s*(\\end\{itemize\})'), r'\n\1'),
+                    (re.compile(r'(\n?\s*\\item\b[^\n]*?)\s*\\\\(?=\s*(\\item|\\end\{itemize\}))', re.S), r'\1')]
+
+GRAPHICS_RE = re.compile(r"\\(?:photo|includegraphics)(?:\[[^\]]*\])*\{([^}]+)\}")
+
 # vibecoded: https://chatgpt.com/c/6904986d-3468-8321-8cb8-30073fe1e723
 
 def main(path):
-    language = "en"
-    cv = CVBuilder(path).build_variant(language=language, length="lg", cat="nontech", annotate_kind=False)
     template_path = "/home/chris/Documents/projects/cstenkamp.de/components/cv_builder/static/cv_template.tex"
     out = "/home/chris/Documents/projects/cstenkamp.de/components/cv/cv_generated.tex"
-    template = pathlib.Path(template_path).read_text(encoding="utf-8")
-    tex = CV2LaTeX(cv, template, site_base="https://cstenkamp.de", include_closing=True, language=language).render()
+    tex = build_tex(CVBuilder(path), dict(language="en", length="lg", cat="nontech"), template_path=template_path)
     pathlib.Path(out).write_text(tex, encoding="utf-8")
 
 
+def build_tex(builder, variant, template_path=TEX_TEMPLATE_PATH, site_base="https://cstenkamp.de", include_closing=True):
+    cv = builder.build_variant(**variant, annotate_kind=False)
+    template = pathlib.Path(template_path).read_text(encoding="utf-8")
+    return CV2LaTeX(cv, template, site_base=site_base, include_closing=include_closing, language=variant["language"]).render()
+
+
+def latex_assets(tex, index):
+    """paths of the images the LaTeX-source includes (photo & signature), looked up by name or stem in `index` (a
+       DirectoryIndex of the image-directory, which servers keep such that it's only listed again if it changed)"""
+    return sorted({path for name in GRAPHICS_RE.findall(tex) if (path := index.get(name)) is not None})
+
+
+def file_hash(path):
+    with open(path, "rb") as rfile:
+        return hashlib.sha1(rfile.read()).hexdigest()
+
+
+def pdf_fingerprint(tex, assets, file_hash=file_hash):
+    """hash of everything the PDF depends on: the LaTeX-source and the included images. `file_hash` gives the
+       content hash of an image (servers pass a cached one, eg. `FileCache.version`)"""
+    sha = hashlib.sha1(tex.encode("utf-8"))
+    for path in assets:
+        sha.update(f"{basename(path)}\0{file_hash(path)}\0".encode("utf-8"))
+    return sha.hexdigest()
+
+
+def compile_pdf(tex_path, img_root=None, timeout=120):
+    """Compiles the .tex-file to a PDF next to it, with latexmk if installed and otherwise with pdflatex (re-run until
+       the references are resolved). Auxiliary files go to a `.latex` subdirectory, images are searched in img_root.
+       Returns the path of the PDF, raises RuntimeError with the end of the log if compiling failed."""
+    out_dir = dirname(os.path.abspath(tex_path))
+    stem = splitext(basename(tex_path))[0]
+    build_dir = join(out_dir, ".latex")
+    os.makedirs(build_dir, exist_ok=True)
+    env = dict(os.environ)
+    if img_root:  # (the trailing separator keeps TeX's default search path)
+        env["TEXINPUTS"] = os.pathsep.join([img_root, os.environ.get("TEXINPUTS", "")])
+    if shutil.which("latexmk"):
+        runs = [["latexmk", "-pdf", "-interaction=nonstopmode", "-halt-on-error", f"-outdir={build_dir}", tex_path]]
+    else:
+        runs = [["pdflatex", "-interaction=nonstopmode", "-halt-on-error", f"-output-directory={build_dir}", tex_path]] * 3
+    log_path = join(build_dir, f"{stem}.log")
+    for cmd in runs:
+        try:
+            res = subprocess.run(cmd, cwd=out_dir, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise RuntimeError(f"Compiling {tex_path} failed: {e}") from e
+        if res.returncode != 0:
+            raise RuntimeError(f"Compiling {tex_path} failed:\n" + res.stdout.decode("utf-8", "replace")[-2000:])
+        with open(log_path, "r", encoding="utf-8", errors="replace") as rfile:
+            if "Rerun to get" not in rfile.read():
+                break
+    os.replace(join(build_dir, f"{stem}.pdf"), pdf_path := join(out_dir, f"{stem}.pdf"))
+    return pdf_path
+
+
 # def main():
 #     ap = argparse.ArgumentParser()
 #     ap.add_argument("--in", required=True)
@@ -32,13 +118,25 @@ def main(path):
 #     pathlib.Path(out_path).write_text(tex, encoding="utf-8")
 
 
+def remove_forbidden_optlong(node):
+    """node-transform: removes the sentences with forbidden texts (see remove_forbidtexts) from the long descriptions"""
+    if isinstance(node, dict) and isinstance(body := node.get("optlong"), str) and (new := remove_forbidtexts(body)) is not body:
+        return {**node, "optlong": new}
+    return node
+
+
+TEX_PIPELINE = Pipeline(node=[remove_forbidden_optlong])  # what the LaTeX-backend does to the sections before formatting
+
+
 class CV2LaTeX:
     def __init__(self, data: Dict[str, Any], template_text: str, site_base: str, include_closing: bool = False, ae_style: bool = False,
-                 cv_style: str = "casual", strip_comments: bool = True, include_social: bool = False, language: str = "en", remove_enclosed: bool = True):
+                 cv_style: str = "casual", strip_comments: bool = True, include_social: bool = False, language: str = "en", remove_enclosed: bool = True,
+                 pipeline: Pipeline = None):
         self.data = data
         self.language = language
         self.ae_style = bool(ae_style)
         self.remove_enclosed = bool(remove_enclosed)
+        self.pipeline = pipeline if pipeline is not None else TEX_PIPELINE if self.remove_enclosed else Pipeline()
         self.tpl = self._apply_style(template_text, cv_style)
         self.site_base = site_base.strip().rstrip("/").removeprefix("https://")
         self.include_closing = include_closing
@@ -128,9 +226,13 @@ class CV2LaTeX:
     def _render_sections(self, sections: Dict[str, Any]) -> str:
         chunks: List[str] = []
         for sec_name, content in sections.items():
-            sec_head = "\\section{%s}" % self._esc(sec_name)
-            body = self._render_section_body(sec_name, content)
-            chunks.append("\n\n" + sec_head + "\n\n" + body)
+            key = (sec_name, content_hash(content), self.site_base, self.pipeline)
+            if (chunk := SECTION_CACHE.get(key)) is None:  # only sections that changed are formatted again
+                sec_head = "\\section{%s}" % self._esc(sec_name)
+                body = self._render_section_body(sec_name, self.pipeline(content))
+                chunk = "\n\n" + sec_head + "\n\n" + body
+                SECTION_CACHE.set(key, chunk)
+            chunks.append(chunk)
         return "".join(chunks) + "\n"
 
 
@@ -170,10 +272,7 @@ class CV2LaTeX:
             if website:
                 opt5 = "\\textit{%s}" % self._urlify(website)
 
-        body = e.get("optlong", "")
-        if self.remove_enclosed:
-            body = remove_forbidtexts(body)
-        body = self._fmt_text(body)
+        body = self._fmt_text(e.get("optlong", ""))
         return "\\cventry{%s}{%s}{%s}{%s}{%s}{%s}" % (time, title, employer, place, opt5, body)
 
     def _render_list_section(self, items: List[Any]) -> str:
@@ -252,89 +351,87 @@ class CV2LaTeX:
             txt = m.group(1)
             url = self._abs_url(m.group(2))
             return "\\httplink[%s]{%s}" % (txt, self._esc_url(url))
-        return re.sub(r"\[([^\]]+)\]\(([^)]+)\)", repl, s or "")
-
-
-    def _smart_quotes(self, t: str) -> str:
-        out = []
-        openq = True
-        i = 0
-        while i < len(t):
-            c = t[i]
-            if c == '"' and (i == 0 or t[i-1] != "\\"):
-                out.append("``" if openq else "''")
-                openq = not openq
-            else:
-                out.append(c)
-            i += 1
-        return "".join(out)
+        return MD_LINK_RE.sub(repl, s or "")
 
     def _fmt_text(self, s: Any) -> str:
         t = str(s or "").replace("\\n", "\n")
-        if re.search(r"(?ms)^[ \t]*\* [^\n]+\n[ \t]*\* [^\n]+", t):
+        if "\n" in t and BULLETS_RE.search(t):
             res = self._render_bullet_blocks(t)
         else:
             res = self._fmt_inline(t)
-        res = re.sub(r'(?<!\\)\\n', r'\\\\', res)  # only literal \n, not real newlines
+        # (the checks skip the substitutions that can't change anything, which is most of the time)
+        if "\\n" in res:
+            res = LITERAL_NEWLINE_RE.sub(r'\\\\', res)  # only literal \n, not real newlines
         res = res.replace("\\\\small", "\\small")
-        res = re.sub(r'(?<!\})\n(?!\\item|\\end\{itemize\})', r'\\\\', res)
-        res = re.sub(r'(?:\\\\\s*)+(?=\\item\b)', '', res)
-        res = re.sub(r'(?:\\\\\s*)+(?=\\begin\{itemize\b)', '', res)
+        if "\n" in res:
+            res = NEWLINE_RE.sub(r'\\\\', res)
+        if "\\\\" in res:
+            res = BREAKS_BEFORE_ITEM_RE.sub('', res)
+            res = BREAKS_BEFORE_ITEMIZE_RE.sub('', res)
         return res
 
     def _fmt_inline(self, s: Any) -> str:
-        t = str(s or "")
-        t = self._md_to_href(t)
-        # bold first, then italics; allow multiline spans
-        t = re.sub(r"(?<!\*)\*\*(.+?)\*\*(?!\*)", r"\\bo{\1}", t, flags=re.S)
-        t = re.sub(r"(?<!\*)\*(.+?)\*(?!\*)", r"\\textit{\1}", t, flags=re.S)
-        # smart quotes
-        t = self._smart_quotes(t)
-        t = (t.replace("•", r"\textbullet{}")
-             .replace("<br>", " \\\\ ")
-             .replace("<br/>", " \\\\ ")
-             .replace("<br />", " \\\\ "))
-        return self._esc(t)
+        """markdown-links, bold, italics, smart quotes, bullets and <br>s to LaTeX, in a single scan (plus one for bold
+           & italics if there are asterisks). Texts that end up containing LaTeX-commands are not escaped."""
+        t, inline_re = str(s or ""), INLINE_RE
+        if "*" in t:
+            if "](" in t and any("*" in m[2] for m in MD_LINK_RE.finditer(t)):
+                t, inline_re = self._md_to_href(t), INLINE_NOLINK_RE  # (so bold & italics can't reach into urls - rare)
+            # bold first, then italics; allow multiline spans
+            t = ITALIC_RE.sub(r"\\textit{\1}", BOLD_RE.sub(r"\\bo{\1}", t))
+        quotes = itertools.cycle(("``", "''"))
+        if "\\" in t or "•" in t or BR_RE.search(t) or ("](" in t and MD_LINK_RE.search(t)):
+            return inline_re.sub(lambda m: self._inline_token(m, quotes), t)
+        return PLAIN_RE.sub(lambda m: next(quotes) if m.lastgroup == "quote" else LATEX_ESCAPES[m[0]], t)
+
+    def _inline_token(self, m: re.Match, quotes) -> str:
+        kind = m.lastgroup
+        if kind == "quote":
+            return next(quotes)
+        if kind == "bullet":
+            return r"\textbullet{}"
+        if kind == "br":
+            return " \\\\ "
+        link = "\\httplink[%s]{%s}" % (m["text"], self._esc_url(self._abs_url(m["url"])))
+        return INLINE_NOLINK_RE.sub(lambda m: self._inline_token(m, quotes), link)  # (quotes etc. inside the link)
 
     def _render_bullet_blocks(self, t: str) -> str:
-        pat = re.compile(r"(?ms)^([ \t]*\* [^\n]+(?:\n[ \t]*\* [^\n]+)+)")
         out, i = [], 0
-        for m in pat.finditer(t):
+        for m in BULLET_BLOCK_RE.finditer(t):
             pre = t[i:m.start()]
             if pre:
                 pre_fmt = self._fmt_inline(pre)
-                pre_fmt = re.sub(r'(?:\s*\\\\\s*)+$', '', pre_fmt)  # drop trailing \\ before envs
+                pre_fmt = self._strip_trailing_breaks(pre_fmt)  # drop trailing \\ before envs
                 out.append(pre_fmt.rstrip())
             block = m.group(1).strip("\n")
-            lines = [re.sub(r"^[ \t]*\* ?", "", ln) for ln in block.split("\n")]
+            lines = [BULLET_MARKER_RE.sub("", ln) for ln in block.split("\n")]
             items = []
             for ln in lines:
                 item_txt = self._fmt_inline(ln)
-                item_txt = re.sub(r'(?:\s*\\\\\s*)+$', '', item_txt)  # no \\ at item ends
+                item_txt = self._strip_trailing_breaks(item_txt)  # no \\ at item ends
                 items.append("\t\\item %s" % item_txt)
             out.append("\n\\begin{itemize}\n\\setlength\\itemsep{0pt}\\setlength\\parsep{0pt}\\setlength\\parskip{0pt}\n%s\n\\end{itemize}" % "\n".join(items))
             i = m.end()
         tail = t[i:]
         if tail:
             tail_fmt = self._fmt_inline(tail)
-            tail_fmt = re.sub(r'(?:\s*\\\\\s*)+$', '', tail_fmt)
+            tail_fmt = self._strip_trailing_breaks(tail_fmt)
             out.append(tail_fmt)
         return self._clean_itemize_glue("".join(out))
 
+    def _strip_trailing_breaks(self, t: str) -> str:
+        return TRAILING_BREAKS_RE.sub('', t) if t.rstrip().endswith("\\\\") else t
+
     def _clean_itemize_glue(self, t: str) -> str:
-        t = re.sub(r'\\par\s*\\\\\s*(\\begin\{itemize\})', r'\\par\n\1', t)
-        t = re.sub(r'(\\begin\{itemize\})\s*\\\\', r'\1\n', t)
-        t = re.sub(r'\\\\\s*(\\end\{itemize\})', r'\n\1', t)
-        t = re.sub(r'(\n?\s*\\item\b[^\n]*?)\s*\\\\(?=\s*(\\item|\\end\{itemize\}))', r'\1', t, flags=re.S)
+        for pattern, repl in ITEMIZE_GLUE_RES:
+            t = pattern.sub(repl, t)
         return t
 
     def _esc(self, s: Any) -> str:
         t = str(s or "")
         if "\\" in t:  # allow LaTeX macros to pass
             return t
-        t = re.sub(r"([%&#_$\{\}])", r"\\\1", t)
-        t = t.replace("^", "\\textasciicircum{}").replace("~", "\\textasciitilde{}")
-        return t
+        return ESC_RE.sub(lambda m: LATEX_ESCAPES[m[0]], t)
 
     def _closing_block(self) -> str:
         return ("\n\n\n\n\\vfill\n"
@@ -359,5 +456,4 @@ def load_data(path: str) -> Dict[str, Any]:
 
 
 if __name__ == "__main__":
-    from os.path import dirname, join
     main(join(dirname(__file__), "..", "cv", "all_cvs.yaml"))
\ No newline at end of file
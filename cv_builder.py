@@ -1,10 +1,287 @@
-from pprint import pprint
+from pprint import pformat
 from datetime import datetime
+import logging
 import re
 import yaml
 import os
 from itertools import permutations, chain
-import requests
+from functools import lru_cache
+from typing import Any, Callable, NamedTuple, Optional
+
+from util.cache import FileCache, LRUCache, Snapshots, content_hash
+from util.link_checker import LinkChecker
+from util.metrics import METRICS
+
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)  # libyaml's (much faster), if PyYAML was built with it
+YAML_SNAPSHOT_DIR = os.getenv("YAML_SNAPSHOT_DIR")  # if set, the parsed YAML is snapshotted there so new processes start warm
+YAML_CACHE = FileCache(lambda raw: yaml.load(raw, Loader=YAML_LOADER), snapshots=Snapshots(YAML_SNAPSHOT_DIR) if YAML_SNAPSHOT_DIR else None)
+IR_SNAPSHOTS = Snapshots(YAML_SNAPSHOT_DIR, suffix=".ir.snapshot") if YAML_SNAPSHOT_DIR else None  # compiled sections
+TRANSLATORS = LRUCache(maxsize=8)  # YAML-version -> Translator, such that its memo survives between requests
+SECTION_HASHES = LRUCache(maxsize=8)  # YAML-version -> {top-level key: content hash of its subtree}
+SECTION_CACHE = LRUCache(maxsize=512)  # ((subtree-hash, config-hash), key, variant) -> (processed section, its links)
+IR_CACHE = LRUCache(maxsize=512)  # (subtree-hash, variants-hash) -> compiled section, see `compile_value`
+logger = logging.getLogger(__name__)
+
+LINK_CHECKS = METRICS.counter("cv_link_checks_total", "Results of checked links (ok, broken or error)")
+
+# everything special that can occur in a key or value, found in a single scan by `tokenize`
+TOKEN_RE = re.compile(r"\[(?P<linktext>[^\]]*)\]\((?P<link>[^)]*)\)"  # markdown-link: [text](url)
+                      r"|\[(?P<bracket>[^\]]*)\]"                      # variant-brackets: [de, lg]
+                      r"|\{(?P<design>[^}]*)}"                          # design-hints: {paragraphs}
+                      r"|img\((?P<img>[^)]*)\)"                         # images: img(name)
+                      r"|date\((?P<date>[^)]*)\)")                      # dates: date(1999-12-31)
+BRACKET_SEP_RE = re.compile(r",\s+")
+
+
+class Tokens(NamedTuple):
+    text: str
+    brackets: tuple = ()        # (start, end, content) of all [..], including the text-part of markdown-links
+    links: tuple = ()           # urls of all markdown-links
+    design: Optional[tuple] = None  # (start, content) of the first {..}
+    img: Optional[tuple] = None     # (start, name) of the first img(..)
+    dates: tuple = ()           # (start, end, date) of all date(..)
+
+    def bracket_variants(self):
+        """set of all comma-separated elements inside brackets, eg. {"de", "lg"} for "title [de, lg]" """
+        return {i.strip() for _, _, content in self.brackets for i in content.split(",")}
+
+    def normalized_brackets(self):
+        """bracket-contents without spaces after the commas, eg. {"de,lg"} for "title [de, lg]" """
+        return {BRACKET_SEP_RE.sub(",", content) for _, _, content in self.brackets}
+
+    def without_brackets(self):
+        res, pos = [], 0
+        for start, end, _ in self.brackets:
+            res.append(self.text[pos:start])
+            pos = end
+        return "".join(res) + self.text[pos:]
+
+
+class Translator():
+    """Word-wise translation with one compiled pattern per language. Only whole words are translated, but they may be
+       adjacent to punctuation (eg. `Hiwi:` or `(Hiwi)`, but not `Hiwi-Job` or `/path/Hiwi`). Results are memoized."""
+    LEFT = r"""(?<![^\s(\["'*„“‚])"""
+    RIGHT = r"""(?=[\s.,;:!?)\]{}"'*“”‘’]|$)"""
+
+    def __init__(self, translations):
+        self.tables = {lang: {str(k): str(v) for k, v in (transl or {}).items()} for lang, transl in translations.items()}
+        self.patterns = {lang: re.compile(self.LEFT + "(" + "|".join(re.escape(i) for i in sorted(table, key=len, reverse=True)) + ")" + self.RIGHT)
+                         for lang, table in self.tables.items() if table}
+        self._memos = {}  # lang -> {text: translation}
+
+    def translate(self, text, lang):
+        if (memo := self._memos.get(lang)) is None:
+            memo = self._memos[lang] = {}
+        if (res := memo.get(text)) is None:
+            pattern, table = self.patterns.get(lang), self.tables.get(lang)
+            res = memo[text] = pattern.sub(lambda m: table[m[1]], text) if pattern else text
+        return res
+
+    def translation(self, lang):
+        """`translate` into one language as a function of the text only (eg. for all texts of a build)"""
+        memo = self._memos.setdefault(lang, {})
+        def translate(text):
+            if (res := memo.get(text)) is None:
+                res = self.translate(text, lang)
+            return res
+        return translate
+
+
+class Variant(dict):
+    """A selected variant (eg. {"language": "de", "length": "sh", "cat": "tech"}), together with the lookup-tables that are
+       needed to resolve keys like `title_de_sh` - these are computed once per build instead of once per dictionary."""
+
+    def __init__(self, variant):
+        super().__init__(variant)
+        # all combinations of the variant's values, from long to short (once we find the most specific one, we're done)
+        self.used_postfixes = sorted(chain.from_iterable(permutations(self.values(), i) for i in range(1, len(self)+1)), key=len, reverse=True)
+        self.ranks = {pf: i for i, pf in enumerate(self.used_postfixes)}  # lower rank = more specific
+        self.value_set = set(self.values())
+
+
+@lru_cache(maxsize=8192)
+def tokenize(text):
+    brackets, links, dates, design, img = [], [], [], None, None
+    for m in TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == "link":
+            brackets.append((m.start(), m.start("linktext") + len(m["linktext"]) + 1, m["linktext"]))
+            links.append(m["link"])
+        elif kind == "bracket":
+            brackets.append((m.start(), m.end(), m["bracket"]))
+        elif kind == "design" and design is None:
+            design = (m.start(), m["design"])
+        elif kind == "img" and img is None:
+            img = (m.start(), m["img"])
+        elif kind == "date":
+            dates.append((m.start(), m.end(), m["date"]))
+    return Tokens(text, tuple(brackets), tuple(links), design, img, tuple(dates))
+
+
+# === The compiled CV: the sections of the YAML are parsed into these (immutable) nodes once, such that building a
+# variant is only a projection of them - without looking at the keys & texts again. Shared between builds & threads! ===
+
+class Build(NamedTuple):
+    """what the nodes are projected with: the variant, the translation into its language, its date-format, and where
+       the used links go"""
+    variant: Variant
+    translate: Callable  # text -> translation
+    datefmt: Optional[str]
+    add_link: Callable
+
+
+class Invalid(NamedTuple):
+    """a value that can't be built (eg. a misplaced img(..) or a wrong date) - raises once a variant uses it"""
+    error: Exception
+
+    def project(self, build, design=None):
+        raise self.error.with_traceback(None)
+
+
+class Text(NamedTuple):
+    """a string or number. `parts` is the text split at its date(..)s, with the dates parsed (None if there are none)"""
+    text: str
+    parts: Optional[tuple] = None
+    links: tuple = ()
+
+    def project(self, build, design=None):
+        txt = self.text if self.parts is None else "".join(i if isinstance(i, str) else i.strftime(build.datefmt) for i in self.parts)
+        txt = build.translate(txt)
+        for url in self.links:
+            build.add_link(url)
+        return txt
+
+
+class Field(NamedTuple):
+    key: Any                     # without postfixes, eg. "title" for `title_de_lg`
+    label: Optional[str]         # the key as it's translated (numbers as strings), None if it's kept as it is
+    postfixes: Optional[tuple]   # eg. ("de", "lg"), None if the key has none
+    value: Any                   # the compiled value, None if it's empty (then the field is left out)
+    design: Optional[str] = None # the {..} of the key
+    special: Any = None          # the parsed value of `show_on` (a frozenset) or `hp_link`
+
+
+class Mapping(NamedTuple):
+    fields: tuple
+    plain: bool = True     # if none of the keys has postfixes
+    special: bool = False  # if there are `show_on` or `hp_link` keys
+
+    def project(self, build, design=None):
+        if self.plain:
+            fields = [i for i in self.fields if i.value is not None]
+        else:
+            # of the keys with the same base (eg. title_de_short), the one with the most specific postfix-combination
+            # that matches wins (or the one without postfix), and all others are ignored
+            ranks, worst = build.variant.ranks, len(build.variant.ranks)
+            chosen = {}  # key -> (rank, index)
+            for i, field in enumerate(self.fields):
+                rank = worst if field.postfixes is None else ranks.get(field.postfixes)
+                if rank is not None and (field.key not in chosen or rank < chosen[field.key][0]):
+                    chosen[field.key] = (rank, i)
+            winners = {i for _, i in chosen.values()}
+            fields = [field for i, field in enumerate(self.fields) if i in winners and field.value is not None]
+        # now handle the special keys "show_on" & "hp_link" (the links in the values are added by their projection)
+        if self.special:
+            if (show_on := next((i.special for i in fields if i.key == "show_on"), None)) is not None:
+                fields = [i for i in fields if i.key != "show_on"] if show_on <= build.variant.value_set else []
+            if (hp_link := next((i.special for i in fields if i.key == "hp_link"), None)) is not None:
+                build.add_link(hp_link)
+        translate = build.translate
+        result = {(i.key if i.label is None else translate(i.label)): i.value.project(build, i.design) for i in fields}
+        if design is not None:
+            result["design"] = design
+        return result
+
+
+class ListText(NamedTuple):
+    text: str
+    brackets: frozenset  # the variants in its brackets, eg. {"de", "lg"} for "Python [de, lg]"
+    stripped: str        # the text without brackets, used if all of them are in the variant
+    other: bool          # if it's kept otherwise: if there are no brackets or none of them is a postfix
+    links: tuple = ()
+
+
+class TextList(NamedTuple):
+    """a list of strings, where every element can be restricted to variants by brackets, eg. `Python [tech]`"""
+    items: tuple
+
+    def project(self, build, design=None):
+        result = []
+        for item in self.items:
+            if item.brackets and item.brackets <= build.variant.value_set:
+                txt = item.stripped  # (links lose their text-part here, so aren't checked)
+            elif item.other:
+                txt = item.text
+                for url in item.links:
+                    build.add_link(url)
+            else:
+                continue
+            if (txt := build.translate(txt)):
+                result.append(txt)
+        return [f"<!--design: {design}-->"] + result if design is not None else result
+
+
+class NodeList(NamedTuple):
+    items: tuple
+
+    def project(self, build, design=None):
+        result = [res for item in self.items if (res := item.project(build))]
+        return [f"<!--design: {design}-->"] + result if design is not None else result
+
+
+@lru_cache(maxsize=8)
+def postfix_pattern(postfixes):
+    """matches keys like `title_de_lg`, with the key in group 1 and the postfixes in group 2 (`_de_lg`)"""
+    return re.compile(r"(.*?)((?:_(?:%s))+)" % "|".join(re.escape(i) for i in sorted(postfixes, key=len, reverse=True)))
+
+
+def compile_value(val, postfixes):
+    """the node of a value of the YAML, for a frozenset of all `postfixes` (the values of all variants). Errors are
+       raised when a variant uses the value, not here."""
+    try:
+        assert isinstance(val, (dict, str, int, float, list, tuple, set))
+        if isinstance(val, dict):
+            fields = tuple(compile_field(k, v, postfixes) for k, v in val.items())
+            return Mapping(fields, all(i.postfixes is None for i in fields), any(i.special is not None for i in fields))
+        if isinstance(val, (list, tuple, set)):
+            if all(isinstance(i, str) for i in val):
+                return TextList(tuple(compile_list_text(i, postfixes) for i in val))
+            return NodeList(tuple(compile_value(i, postfixes) for i in val))
+        if not isinstance(val, str):
+            return Text(str(val))
+        tokens = tokenize(val)
+        if tokens.img:
+            assert tokens.img[0] == 0, "if you use 'img(..)', that must be the full value!"
+        parts, pos = None, 0
+        if tokens.dates:
+            parts = []
+            for start, end, date in tokens.dates:
+                parts += [val[pos:start], datetime.strptime(date, "%Y-%m-%d")]
+                pos = end
+            parts = tuple(parts + [val[pos:]])
+        return Text(val, parts, tokens.links)
+    except Exception as e:
+        return Invalid(e)
+
+
+def compile_field(key, val, postfixes):
+    m = postfix_pattern(postfixes).fullmatch(key) if isinstance(key, str) else None
+    base, key_postfixes = (key, None) if m is None else (m[1], tuple(m[2][1:].split("_")))
+    special = None
+    if val and base == "show_on":
+        special = frozenset(i.strip() for i in val.split(",")) if isinstance(val, str) else frozenset(val)
+    elif val and base == "hp_link":
+        special = val
+    label = base if isinstance(base, str) else str(base) if isinstance(base, (int, float)) else None
+    design = tokenize(str(base)).design
+    return Field(base, label, key_postfixes, compile_value(val, postfixes) if val else None, design and design[1], special)
+
+
+def compile_list_text(text, postfixes):
+    tokens = tokenize(text)
+    brackets = frozenset(tokens.bracket_variants())
+    return ListText(text, brackets, tokens.without_brackets().strip(), not brackets or not len(brackets - postfixes) < len(brackets),
+                    tokens.links)
 
 
 def main(path):
@@ -23,15 +300,52 @@ def main(path):
 class CVBuilder():
     def __init__(self, path):
         self.path = os.path.abspath(path)
-        self.yaml = self.load_yaml()
+        self.yaml, self.version = self.load_yaml()  # (the version is that of the loaded content, even if the file changes)
         self.translations = self.yaml["translations"]
+        if (translator := TRANSLATORS.get(self.version)) is None:
+            translator = Translator(self.translations)
+            TRANSLATORS.set(self.version, translator)
+        self.translator = translator
         self.all_links = []
+        if IR_SNAPSHOTS is not None:
+            self.restore_compiled()
 
     def load_yaml(self):
-        print("CV YAML Path:", self.path)
-        with open(self.path, "r") as rfile:
-            cv = yaml.load(rfile, Loader=yaml.SafeLoader)
-        return cv
+        """(parsed YAML, its content hash). The parsed YAML is shared between all builders -> don't modify it!"""
+        logger.debug("CV YAML Path: %s", self.path)
+        return YAML_CACHE.load(self.path)
+
+    @property
+    def section_hashes(self):
+        """content hash of every top-level entry of the YAML, computed once per YAML version"""
+        if (hashes := SECTION_HASHES.get(self.version)) is None:
+            hashes = {k: content_hash(v) for k, v in self.yaml.items()}
+            SECTION_HASHES.set(self.version, hashes)
+        return hashes
+
+    def ir_key(self, yaml_key):
+        return (self.section_hashes[yaml_key], self.section_hashes.get("variants"))
+
+    def compile_section(self, yaml_key):
+        """the compiled top-level entry of the YAML, see `compile_value`. Compiled once per content (and variants),
+           such that only changed sections are compiled again - shared between builders, so don't modify it!"""
+        key = self.ir_key(yaml_key)
+        if (node := IR_CACHE.get(key)) is None:
+            node = compile_value(self.yaml[yaml_key], frozenset(self.all_postfixes()))
+            IR_CACHE.set(key, node)
+        return node
+
+    def restore_compiled(self):
+        """(with YAML_SNAPSHOT_DIR) fills IR_CACHE with all sections from the snapshot of this YAML-version, or compiles
+           them and writes the snapshot - such that new processes don't compile them again"""
+        keys = {k: self.ir_key(k) for k in self.yaml if k not in ["variants", "translations"]}
+        if set(keys.values()) <= set(IR_CACHE.keys()):
+            return
+        if (nodes := IR_SNAPSHOTS.load(self.path, self.version)) is None:
+            nodes = {key: self.compile_section(k) for k, key in keys.items()}
+            IR_SNAPSHOTS.save(self.path, self.version, nodes)
+        for key, node in nodes.items():
+            IR_CACHE.set(key, node)
 
     # === Getting all possible variants ===
 
@@ -63,22 +377,13 @@ class CVBuilder():
     def all_postfixes(self):
         return [v2 for v in self.list_variants().values() for v2 in v.values()]
 
-    def _get_used_postfixes(self, variant):
-        perms = list(chain.from_iterable(permutations(variant.values(), i) for i in range(1, len(variant)+1)))
-        return sorted(perms, key=lambda p: len(p), reverse=True)  # we want to go from long to short
-        # once we find the most specific postfix, we can remove all others
-
     # === language tools ===
 
     def wordwise_translate(self, what, tolang):
-        # TODO does not work if there's eg a colon after the word
-        transl = self.translations[tolang]
         if isinstance(what, (int, float)):
             what = str(what)
         if isinstance(what, str):
-            what = what.replace(":", " :").replace("{", " {").replace(",", " ,")
-            what = " ".join([transl.get(i, i) for i in what.split(" ")])
-            what = what.replace(" :", ":").replace(" {", "{").replace(" ,", ",")
+            what = self.translator.translate(what, tolang)
         elif isinstance(what, (list, set, tuple)):
             what = [self.wordwise_translate(i, tolang) for i in what]
         return what
@@ -95,29 +400,31 @@ class CVBuilder():
     # === main builder ===
 
     def build_variant(self, language, annotate_kind=True, **kwargs):
-        variant = {**self.default_variants(), **{"language": language, **kwargs}}
-        print("Building variant:", variant)
+        variant = Variant({**self.default_variants(), **{"language": language, **kwargs}})
+        logger.debug("Building variant: %s", variant)
 
         # remove all entries for a variants not considered here (eg. "Programmiersprachen [de]" in english version):
-        considered_keybrackets = ["[" + ",".join(i) + "]" for i in self._get_used_postfixes(variant)]
-        ncv = {}
-        for k, v in self.yaml.items():
-            if k not in ["variants", "translations"]:
-                k = self.wordwise_translate(k, language)
-                if not re.match(r".*?\[.*?\].*?", k):
-                    ncv[k] = v
-                else:
-                    for var in considered_keybrackets:
-                        k = re.sub(r'\[([^\]]*)\]', lambda m: '[' + re.sub(r',\s+', ',', m.group(1)) + ']', k)
-                        if var in k:  # ^ # remove spaces after commas in brackets
-                            key = re.sub(r"(\[.*?\])", "", k).strip()
-                            if key not in ncv: # we go from long to short, so the most specific gets looked at first
-                                ncv[key] = v
-        print()
-        # go through the sections for selection and translation
-        cv = {k: self.handle_values(v, variant, k) for k, v in ncv.items()}
-        cv = {(k if not re.match(r".*?\{(.*?)}", k) else re.match(r"(.*?)\{", k)[1]).strip(): v for k, v in cv.items() if v}
-        pprint(cv, width=200, sort_dicts=False)
+        considered_keybrackets = {",".join(i) for i in variant.used_postfixes}
+        ncv, hashes = {}, {}
+        for yaml_key in self.yaml:
+            if yaml_key not in ["variants", "translations"]:
+                k = self.wordwise_translate(yaml_key, language)
+                tokens = tokenize(k)
+                if not tokens.brackets:
+                    ncv[k], hashes[k] = yaml_key, self.section_hashes[yaml_key]
+                elif tokens.normalized_brackets() & considered_keybrackets:
+                    key = tokens.without_brackets().strip()
+                    if key not in ncv: # the first key in the YAML that matches wins
+                        ncv[key], hashes[key] = yaml_key, self.section_hashes[yaml_key]
+        # project the sections onto the variant for selection and translation (only those whose YAML changed are
+        # processed again)
+        config_hash = (self.section_hashes.get("variants"), self.section_hashes.get("translations"))
+        datefmt = (self.yaml["variants"]["language"].get(language) or {}).get("datefmt")
+        build = Build(variant, self.translator.translation(language), datefmt, self.add_link)
+        cv = {k: self.handle_section(self.compile_section(yaml_key), build, k, (hashes[k], config_hash)) for k, yaml_key in ncv.items()}
+        cv = {(k if not (design := tokenize(k).design) else k[:design[0]]).strip(): v for k, v in cv.items() if v}
+        if logger.isEnabledFor(logging.DEBUG):  # (formatting the whole CV is expensive, so only if it's shown)
+            logger.debug("Built variant %s:\n%s", variant, pformat(cv, width=200, sort_dicts=False))
 
         if annotate_kind:
             cv = {k: {"chronog": v} if isinstance(v, list) and all(isinstance(i, dict) for i in v) \
@@ -127,115 +434,38 @@ class CVBuilder():
                   for k, v in cv.items()}
         return cv
 
-    # === The functions that are recursively called on all dictionaries & lists to get the right variant etc ===
-
-    def handle_values(self, val, variant, key=""):
-        """ handles dictionary values. In the first order those correspond to section content, however this is called
-            recursively (handle_values -> handle_subdict -> handle_values). Special Treatmens are: img(..) & date(..)"""
-        # img & date
-        assert isinstance(val, (dict, str, int, float, list, tuple, set))
-        if isinstance(val, str) and "img(" in val:
-            assert re.match(r"img\((.*?)\)", val)[0] == "img("+re.match(r"img\((.*?)\)", val)[1]+")", "if you use 'img(..)', that must be the full value!"
-        if isinstance(val, str) and "date(" in val:
-            date = datetime.strptime(re.match(r"date\((.*?)\)", val)[1], "%Y-%m-%d")
-            fmtstring = self.yaml["variants"]["language"][variant["language"]]["datefmt"]
-            val = re.sub(r"date\(.*?\)", date.strftime(fmtstring), val)
-
-        result = self.handle_subdict(val, variant) if isinstance(val, dict) \
-                else self.wordwise_translate(val, variant["language"]) if isinstance(val, (str, int, float)) \
-                else self.handle_sublist(val, variant) if isinstance(val, (list, tuple, set)) \
-                else self.wordwise_translate(val, variant["language"])
-
-        # always add links...
-        if isinstance(val, str):
-            for j in re.findall(r"\[.*?\]\((.*?)\)", val):
-                self.all_links.append(j if j.startswith("http") else "https://cstenkamp.de/" + j.removeprefix("/"))
-
-        # now if the key had design-instructions (in curly brackets) add that here
-        if re.match(r".*?\{.*?}", key):
-            design_info = re.match(r".*?\{(.*?)}", key)[1]
-            if isinstance(result, dict):
-                result["design"] = design_info
-            elif isinstance(result, list):
-                result = [f"<!--design: {design_info}-->"]+result
-        return result
-
-
-    def handle_subdict(self, di, variant):
-        used_postfixes = ["_"+"_".join(i) for i in self._get_used_postfixes(variant)]
-        # remove all those keys that indicate undemanded variants (eg. title_de_short) - for that
-        # we take the longest postfix-combination that matches, and then remove all others of the same name
-        varianted_keys = variant_basekeys = {k for k in di.keys() if any(i in k for i in used_postfixes)}
-        for pf in self.all_postfixes():
-            variant_basekeys = {i.removesuffix(f"_{pf}")for i in variant_basekeys}
-        basekeys2 = {i for i in variant_basekeys}
-        used_variants = {}
-        for pf in used_postfixes:
-            for var in varianted_keys:
-                if var.endswith(pf) and var.removesuffix(pf) in variant_basekeys:  # the first found one is the longest -> ignore all others
-                    # print(f"{var.removesuffix(pf)} -> {var}")
-                    variant_basekeys.remove(var.removesuffix(pf))
-                    used_variants[var] = var.removesuffix(pf)
-        # di = {used_variants.get(k, k): v for k, v in di.items() if (not any(k.endswith("_"+i) for i in self.all_postfixes()) or k in used_variants) and v}
-        di = {used_variants.get(k, k): v for k, v in di.items() if ((not any(k.endswith("_"+i) for i in self.all_postfixes()) and k not in basekeys2) or k in used_variants) and v}
-
-        # now handle the special key "show_on"
-        if "show_on" in di:
-            if isinstance(di["show_on"], str):
-                di["show_on"] = set(i.strip() for i in di["show_on"].split(","))
-            if set(di["show_on"]).issubset(set(variant.values())):
-                di = {k: v for k, v in di.items() if k != "show_on"}
-            else:
-                di = {}
-
-        # check links
-        for v in di.values():
-            if isinstance(v, str) and re.match(r"\[.*?\]\(.*?\)", v):
-                for i in re.findall(r"\[.*?\]\((.*?)\)", v):
-                    self.all_links.append(i if i.startswith("http") else "https://cstenkamp.de/" + i.removeprefix("/"))
-        if di.get("hp_link"):
-            self.all_links.append(di["hp_link"] if di["hp_link"].startswith("http") else "https://cstenkamp.de/" + di["hp_link"].removeprefix("/"))
-
-        di = {self.wordwise_translate(k, variant["language"]): self.handle_values(v, variant, k) for k, v in di.items()}
-        # pprint(di, width=200, sort_dicts=False)
-        return di
-
-    def handle_sublist(self, lst, variant):
-        if all(isinstance(i, str) for i in lst):
-            lst = self.handle_textual_sublist(lst, variant)
-        else:
-            lst = [self.handle_values(elem, variant) for elem in lst]
-        return [self.wordwise_translate(i, variant["language"]) for i in lst if i]
-
-    def handle_textual_sublist(self, lst, variant):
-        nlst = []
-        for elem in lst:
-            if (parantheses := set(re.findall(r"\[(.*?)\]", elem))):
-                parantheses = set(i.strip() for j in parantheses for i in j.split(","))
-                if parantheses.issubset(set(variant.values())):
-                    nlst.append(re.sub(r"\[.*?\]", "", elem).strip())
-                elif not len(parantheses - set(self.all_postfixes())) < len(parantheses):
-                    nlst.append(elem)
-            else:
-                nlst.append(elem)
-        for i in nlst:
-            for j in re.findall(r"\[.*?\]\((.*?)\)", i):
-                self.all_links.append(j if j.startswith("http") else "https://cstenkamp.de/"+j.removeprefix("/"))
-        return nlst
-
-    def check_links(self, timeout=20):
+    def handle_section(self, node, build, key, source_hash):
+        """projection of a compiled top-level section, cached by the hash of its YAML subtree (and of the variants &
+           translations). The cached sections are shared between builds, so treat the result as read-only!"""
+        cache_key = (source_hash, key, tuple(sorted(build.variant.items())))
+        if (cached := SECTION_CACHE.get(cache_key)) is None:
+            n_links = len(self.all_links)
+            design = tokenize(str(key)).design
+            result = node.project(build, design and design[1])
+            cached = (result, self.all_links[n_links:])
+            SECTION_CACHE.set(cache_key, cached)
+        self.all_links.extend(cached[1])
+        return cached[0]
+
+    def add_link(self, url):
+        self.all_links.append(url if url.startswith("http") else "https://cstenkamp.de/" + url.removeprefix("/"))
+
+    def check_links(self, timeout=10, cache_path=None, ttl=24*3600):
+        """checks all links found while building (concurrently). Results are cached for `ttl` seconds in `cache_path`
+           (default: `.linkcheck.json` next to the YAML), so only stale links are re-checked on the next run."""
         self.all_links = set(self.all_links)
-        print(f"Testing {len(self.all_links)} links...")
-        results = []
-        for url in self.all_links:
-            try:
-                r = requests.get(url, timeout=10)
-                results.append((url, r.status_code, r.ok))
-                if not r.ok or r.status_code != 200:
-                    print(f"{url} returned {r.status_code}")
-            except requests.RequestException as e:
-                results.append((url, None, False))
-                print(f"{url} raised an Exception")
+        logger.info("Testing %d links...", len(self.all_links))
+        checker = LinkChecker(cache_path=cache_path or os.path.join(os.path.dirname(self.path), ".linkcheck.json"), ttl=ttl, timeout=timeout)
+        try:
+            results = checker.check(self.all_links)
+        finally:
+            checker.close()
+        for url, status, ok in results:
+            if status is None:
+                logger.warning("%s raised an Exception", url)
+            elif not ok or status != 200:
+                logger.warning("%s returned %s", url, status)
+            LINK_CHECKS.inc(result="error" if status is None else "ok" if ok else "broken")
         return results
 
 
@@ -243,4 +473,5 @@ class CVBuilder():
 
 if __name__ == '__main__':
     from os.path import dirname, join
+    logging.basicConfig(level=os.getenv("LOG_LEVEL") or "DEBUG", format="%(message)s")
     main(join(dirname(__file__), "..", "cv", "all_cvs.yaml"))
\ No newline at end of file
@@ -1,8 +1,11 @@
 import re
+import threading
+from functools import lru_cache
+
 import markdown
-from jinja2.filters import FILTERS
 
 from util.text_util import split_into_sentences
+from util.transform import Pipeline
 
 SECTIONTRANSLATE = { # also specifies order!
     "personal_data": ["Personal Information", "Persönliche Daten", "personal_data"],
@@ -18,6 +21,11 @@ SECTIONTRANSLATE = { # also specifies order!
 
 IGNORE_SECTIONS = ["personal_data", "Basic Info"]
 
+FORBIDDEN_TEXTS = frozenset({"enclosed", "handed in"})  # sentences with these are removed
+TAG_RE = re.compile(r"<.*?>")
+
+_local = threading.local()
+
 
 ########################################################################################################################
 
@@ -25,43 +33,32 @@ def regex_search(value, regex):
     """https://stackoverflow.com/a/67384801/5122790"""
     if value and bool(re.search(regex, value)):
         return value[re.search(regex, value).regs[1][0]:re.search(regex, value).regs[1][1]]
-FILTERS["regex_search"] = regex_search
-
-
-def update(original_dict, future_dict = None, fn = None):
-    # Recursively updates values of a nested dict by performing recursive calls
-    # https://stackoverflow.com/a/56630315/5122790
-    future_dict = future_dict or original_dict
-    fn = fn or (lambda x: x)
-    if isinstance(original_dict, dict):
-        tmp_dict = {}
-        for key, value in original_dict.items():
-            tmp_dict[key] = update(value, future_dict, fn)
-        return tmp_dict
-    elif isinstance(original_dict, (list, tuple)):
-        tmp_list = []
-        for i in original_dict:
-            tmp_list.append(update(i, future_dict, fn))
-        return tmp_list
-    elif isinstance(original_dict, str):
-        return fn(original_dict)
-
-def remove_forbidtexts(txt):
+
+
+def remove_forbidtexts(txt, forbidden=FORBIDDEN_TEXTS):
     # TODO gosh I should use nltk instead of this split_into_sentences holy shit
-    for forbid_txt in ["enclosed", "handed in"]:
-        if forbid_txt in txt: # remove the text, but keep the HTML-tags lol
-            txt = " ".join([i if not forbid_txt in i else "".join([j.group() for j in re.finditer(r"<(.*?)>", i) if j]) for i in split_into_sentences(txt)])
-            txt = txt.replace("www. ", "www.")
-            txt = txt.rstrip("*").rstrip()
-    return txt
+    if not (found := [i for i in forbidden if i in txt]):
+        return txt
+    # remove the sentences with any of the texts in one go, but keep the HTML-tags lol
+    txt = " ".join(i if not any(j in i for j in found) else "".join(TAG_RE.findall(i)) for i in split_into_sentences(txt))
+    txt = txt.replace("www. ", "www.")
+    return txt.rstrip("*").rstrip()
+
+def markdown_engine():
+    """one Markdown-instance per thread (setting it up with all extensions is more work than converting a short text)"""
+    if (md := getattr(_local, "markdown", None)) is None:
+        md = _local.markdown = markdown.Markdown()
+    return md.reset()
 
+
+@lru_cache(maxsize=4096)  # many texts (places, employers, dates, ...) repeat across entries and variants
 def inline_edit(txt):
     txt = txt.replace("\small ", "").replace("\small", "")
 
     # compact markdown-lists
     txt = re.sub(r"(^\s?[^*].*?)\\n", r"\1\n\n", txt) # first markdown-list-element without double newline
     txt = txt.replace("\\n", "\n")
-    txt = markdown.markdown(txt).removeprefix("<p>").removesuffix("</p>")
+    txt = markdown_engine().convert(txt).removeprefix("<p>").removesuffix("</p>")
 
     txt = txt.replace("<li>", "<li class=noinline>")
     txt = remove_forbidtexts(txt)
@@ -69,3 +66,5 @@ def inline_edit(txt):
 
     return txt
 
+
+HTML_PIPELINE = Pipeline(leaf=[inline_edit])  # what the HTML-backend does to the texts of the built CV
@@ -1,5 +1,8 @@
 from flask.cli import FlaskGroup
-from serve import app
+from serve import app, watch_command
+from precompile import precompile_command
 cli = FlaskGroup(app)
+cli.add_command(precompile_command)
+cli.add_command(watch_command)
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,112 @@
+"""Renders every variant combination (HTML, JSON, LaTeX & optionally PDF) ahead of time into a directory, such that
+   `serve.py` can serve them as static files (set `PREBUILT_ROOT` to the output directory). Run as
+   `python manage.py precompile OUT_DIR`."""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import product
+from os.path import join
+
+import click
+
+import serve
+from build_latex import build_tex, compile_pdf, latex_assets, pdf_fingerprint
+from cv_builder import CVBuilder
+
+
+def all_variants(builder):
+    """cartesian product of all variant-categories, in the same form as `serve.get_variant` returns them"""
+    variants = builder.list_variants()
+    for combo in product(*[v.values() for v in variants.values()]):
+        yield dict(zip([k.lower() for k in variants.keys()], combo))
+
+
+def _write(out_dir, fname, content):
+    """atomic, such that a server reading out_dir meanwhile sees either the old or the new file, never a partial one"""
+    content = content.encode("utf-8") if isinstance(content, str) else content
+    tmp_path = join(out_dir, f".{fname}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as wfile:
+        wfile.write(content)
+    os.replace(tmp_path, join(out_dir, fname))
+    return fname, hashlib.sha1(content).hexdigest()
+
+
+def build_one(variant, out_dir, with_tex=True, site_base="https://cstenkamp.de", include_closing=False):
+    """returns ({fname: hash}, seconds) for the files of this variant"""
+    tic = time.perf_counter()
+    builder = CVBuilder(serve.YAML_PATH)
+    stem = serve.variant_stem(variant)
+    with serve.app.app_context():
+        files = [_write(out_dir, f"{stem}.html", serve.render_cv(builder, variant)),
+                 _write(out_dir, f"{stem}.json", serve.render_yaml(builder, variant))]
+    if with_tex:
+        files.append(_write(out_dir, f"{stem}.tex", build_tex(builder, variant, site_base=site_base, include_closing=include_closing)))
+    return dict(files), time.perf_counter() - tic
+
+
+def compile_one(out_dir, stem, previous):
+    """compiles {stem}.tex unless neither it nor its images changed since the PDF in out_dir was built.
+       Returns (fname, fingerprint, seconds or None if skipped)"""
+    with open(join(out_dir, f"{stem}.tex"), "r", encoding="utf-8") as rfile:
+        tex = rfile.read()
+    fingerprint = pdf_fingerprint(tex, latex_assets(tex, serve.IMAGE_INDEX))
+    if previous.get(f"{stem}.pdf") == fingerprint and os.path.isfile(join(out_dir, f"{stem}.pdf")):
+        return f"{stem}.pdf", fingerprint, None
+    tic = time.perf_counter()
+    compile_pdf(join(out_dir, f"{stem}.tex"), img_root=serve.IMG_ROOT)
+    return f"{stem}.pdf", fingerprint, time.perf_counter() - tic
+
+
+def compile_all(out_dir, stems, previous, processes=None):
+    """compiles the LaTeX-files with at most `processes` TeX-processes at once, returns {pdf-fname: fingerprint}"""
+    with ThreadPoolExecutor(max_workers=processes or os.cpu_count()) as pool:  # (threads that wait for TeX-processes)
+        results = list(pool.map(lambda stem: compile_one(out_dir, stem, previous), stems))
+    for fname, _, secs in results:
+        click.echo(f"  {fname}: " + ("unchanged" if secs is None else f"compiled in {secs:.2f}s"))
+    return {fname: fingerprint for fname, fingerprint, _ in results}
+
+
+def precompile(out_dir, processes=None, with_tex=True, site_base="https://cstenkamp.de", include_closing=False, with_pdf=False):
+    os.makedirs(out_dir, exist_ok=True)
+    builder = CVBuilder(serve.YAML_PATH)
+    versions = serve.source_versions(builder)  # taken before building, so a concurrent edit makes the result stale
+    variants = list(all_variants(builder))
+    manifest_path = join(out_dir, "manifest.json")
+    previous = serve.MANIFEST_CACHE.get(manifest_path).get("pdf_sources", {}) if os.path.isfile(manifest_path) else {}
+    if os.path.isfile(manifest_path):  # (the old files stop being served, instead of mixing them with the new ones)
+        os.remove(manifest_path)
+    files, pdf_sources = {}, {}
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        for variant, (res, secs) in zip(variants, pool.map(partial(build_one, out_dir=out_dir, with_tex=with_tex, site_base=site_base, include_closing=include_closing), variants)):
+            click.echo(f"  {serve.variant_stem(variant)}: rendered in {secs:.2f}s")
+            files.update(res)
+    if with_pdf:
+        pdf_sources = compile_all(out_dir, [serve.variant_stem(i) for i in variants], previous, processes=processes)
+        for fname in pdf_sources:
+            with open(join(out_dir, fname), "rb") as rfile:
+                files[fname] = hashlib.sha1(rfile.read()).hexdigest()
+    # the manifest is written last, such that the server never sees a half-written build as valid
+    _write(out_dir, "manifest.json", json.dumps({"versions": versions, "files": files, "pdf_sources": pdf_sources}, indent=2))
+    return files
+
+
+@click.command("precompile")
+@click.argument("out_dir", type=click.Path(file_okay=False))
+@click.option("--processes", "-j", type=int, default=None, help="number of worker processes (default: #CPUs)")
+@click.option("--no-tex", is_flag=True, help="don't generate the LaTeX files")
+@click.option("--site-base", default="https://cstenkamp.de", help="base-URL for relative links in the LaTeX files")
+@click.option("--closing", is_flag=True, help="add the closing block (city, date & signature) to the LaTeX files")
+@click.option("--pdf", is_flag=True, help="compile the LaTeX files to PDF (needs latexmk or pdflatex), skipping unchanged ones")
+def precompile_command(out_dir, processes, no_tex, site_base, closing, pdf):
+    """Render all variants into OUT_DIR (serve them by setting PREBUILT_ROOT=OUT_DIR)."""
+    if pdf and no_tex:
+        raise click.UsageError("--pdf needs the LaTeX files, so it can't be combined with --no-tex")
+    files = precompile(out_dir, processes=processes, with_tex=not no_tex, site_base=site_base, include_closing=closing, with_pdf=pdf)
+    click.echo(f"Wrote {len(files)} files to {out_dir}")
+
+
+if __name__ == "__main__":
+    precompile_command()
@@ -1,12 +1,30 @@
-from os.path import dirname, isfile, join, splitext
-from os import listdir, getenv
+from os.path import abspath, basename, dirname, getmtime, isfile, join, relpath, sep
+from os import getenv, makedirs, replace
+import tempfile
+import hashlib
+from glob import glob
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
-from flask import Flask, make_response, request, send_file
+import click
+from flask import Flask, abort, g, has_request_context, make_response, request, send_file
 from flask_cors import CORS, cross_origin
-from jinja2 import Template
+from werkzeug.security import safe_join
+from werkzeug.serving import run_simple
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 
-from jinja_cv_html import IGNORE_SECTIONS, SECTIONTRANSLATE, update, inline_edit
-from cv_builder import CVBuilder
+from jinja_cv_html import IGNORE_SECTIONS, SECTIONTRANSLATE, HTML_PIPELINE, inline_edit, regex_search
+from cv_builder import CVBuilder, IR_CACHE, SECTION_CACHE, YAML_CACHE, tokenize
+from build_latex import SECTION_CACHE as TEX_SECTION_CACHE, TEX_TEMPLATE_PATH, build_tex, compile_pdf, latex_assets, pdf_fingerprint
+from util.cache import DirectoryIndex, FileCache, LRUCache, SingleFlight, content_hash
+from util.images import rendition
+from util.metrics import METRICS
+from util.watcher import Broadcaster, Watcher
 
 
 FLASK_RUN_PORT   = getenv("FLASK_RUN_PORT")   or 8003
@@ -17,13 +35,78 @@ HUGO_PUBLIC_URL  = getenv("HUGO_PUBLIC_URL")  or "http://localhost:1313"
 BUILDER_BASE_URL = getenv("BUILDER_BASE_URL") or f"http://localhost:{FLASK_RUN_PORT}"
 GET_IMAGE_URL    = getenv("GET_IMAGE_URL")    or f"{BUILDER_BASE_URL}/getimage"
 CV_CSS_URL       = getenv("CV_CSS_URL")       or f"{BUILDER_BASE_URL}/cv.css"
+RENDER_CACHE_SIZE = int(getenv("RENDER_CACHE_SIZE") or 64)
+RENDER_CACHE_TTL  = float(getenv("RENDER_CACHE_TTL")) if getenv("RENDER_CACHE_TTL") else None  # seconds
+STREAM_HTML      = (getenv("STREAM_HTML") or "0") == "1"  # send /cv in chunks instead of rendering it completely first
+STREAM_BUFFER_SIZE = int(getenv("STREAM_BUFFER_SIZE") or 32)  # number of template-events per chunk
+JINJA_CACHE_DIR  = getenv("JINJA_CACHE_DIR")  # if set, compiled templates are cached there so new workers start warm
+PREBUILT_ROOT    = getenv("PREBUILT_ROOT")    # output-dir of `manage.py precompile`, if set these files are served first
+BUILD_ID         = getenv("CONTAINER_GIT_COMMIT") or ""  # part of the ETags (with CODE_VERSION), so a new deployment invalidates them
+MAX_AGE_CV       = int(getenv("MAX_AGE_CV")    or 300)  # Cache-Control max-age (seconds) per route
+MAX_AGE_YAML     = int(getenv("MAX_AGE_YAML")  or 300)
+MAX_AGE_CSS      = int(getenv("MAX_AGE_CSS")   or 3600)
+MAX_AGE_IMAGE    = int(getenv("MAX_AGE_IMAGE") or 86400)
+IMAGE_CACHE_DIR  = getenv("IMAGE_CACHE_DIR")  or join(tempfile.gettempdir(), "cv_builder_images")  # resized images
+MAX_AGE_PDF      = int(getenv("MAX_AGE_PDF")   or 300)
+PDF_CACHE_DIR    = getenv("PDF_CACHE_DIR")    or join(tempfile.gettempdir(), "cv_builder_pdfs")  # compiled PDFs
+PDF_WORKERS      = int(getenv("PDF_WORKERS")   or 2)  # number of TeX-processes at once
+PDF_SITE_BASE    = getenv("PDF_SITE_BASE")    or "https://cstenkamp.de"  # base-URL for relative links in the PDF
+WATCH            = (getenv("WATCH") or "0") == "1"  # dev-mode: rebuild when the sources change & reload open pages
+LOG_LEVEL        = getenv("LOG_LEVEL")        or "INFO"  # DEBUG also logs every built variant (slow, not for production)
+CV_CSS_PATH      = join(dirname(__file__), "static", "cv.css")
 
 ####################################################################################
 
+logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 app.config.from_object(__name__)
 CORS(app)
 
+if JINJA_CACHE_DIR:
+    makedirs(JINJA_CACHE_DIR, exist_ok=True)
+JINJA_ENV = Environment(loader=FileSystemLoader(dirname(TEMPLATE_PATH)), auto_reload=True,
+                        bytecode_cache=FileSystemBytecodeCache(JINJA_CACHE_DIR) if JINJA_CACHE_DIR else None)
+JINJA_ENV.filters["regex_search"] = regex_search
+
+
+def code_version():
+    """hash of the Python sources at startup: output can change with the code alone, so the ETags and prebuilt files
+       depend on it - also when CONTAINER_GIT_COMMIT isn't set"""
+    digest = hashlib.sha1()
+    root = dirname(abspath(__file__))
+    for path in sorted(glob(join(root, "*.py")) + glob(join(root, "util", "*.py"))):
+        with open(path, "rb") as rfile:
+            digest.update(relpath(path, root).encode("utf-8") + b"\0" + rfile.read())
+    return digest.hexdigest()
+
+
+CODE_VERSION = code_version()
+VERSIONS = FileCache(lambda raw: None)  # only used for content-hashes of the template & assets, not their content
+MANIFEST_CACHE = FileCache(json.loads)
+RENDER_CACHE = LRUCache(maxsize=RENDER_CACHE_SIZE, ttl=RENDER_CACHE_TTL)
+IMAGE_INDEX = DirectoryIndex(IMG_ROOT)
+SECTION_HTML_CACHE = LRUCache(maxsize=512)  # content hash of a section -> the section after inline_edit
+RECENT_VARIANTS = LRUCache(maxsize=16)  # (kind, variant) of recent requests, which are rebuilt eagerly in watch-mode
+LIVE_RELOAD = Broadcaster()
+WATCHER = None
+_watcher_lock = threading.Lock()
+PDF_POOL = ThreadPoolExecutor(max_workers=PDF_WORKERS, thread_name_prefix="pdf")  # (threads waiting for TeX)
+PDF_FLIGHTS = SingleFlight()  # concurrent requests for the same PDF wait for one compilation
+RENDER_FLIGHTS = SingleFlight()  # concurrent requests for the same render_cache_key wait for one render
+
+REQUEST_SECONDS = METRICS.histogram("cv_request_seconds", "Time until the response is returned (streamed responses: before their body), by endpoint")
+REQUESTS = METRICS.counter("cv_requests_total", "Requests by endpoint and status code")
+STAGE_SECONDS = METRICS.histogram("cv_stage_seconds", "Time spent per stage of building a response")
+CACHE_HITS = METRICS.counter("cv_cache_hits_total", "Cache hits, by cache")
+CACHE_MISSES = METRICS.counter("cv_cache_misses_total", "Cache misses, by cache")
+CACHE_SIZE = METRICS.gauge("cv_cache_entries", "Number of entries, by cache")
+FLIGHT_CALLS = METRICS.counter("cv_singleflight_calls_total", "Calls that did the work, by kind")
+FLIGHT_COALESCED = METRICS.counter("cv_singleflight_coalesced_total", "Calls that waited for a running one instead, by kind")
+FLIGHT_RUNNING = METRICS.gauge("cv_singleflight_in_flight", "Currently running calls, by kind")
+YAML_PARSE_SECONDS = METRICS.counter("cv_yaml_parse_seconds_total", "Total time spent parsing the YAML")
+
 @app.errorhandler(404)
 def not_found(*args, **kwargs):
     """Page not found."""
@@ -32,13 +115,44 @@ def not_found(*args, **kwargs):
 
 @app.before_request
 def before_request(*args, **kwargs):
-    print(end='')
+    g.request_start = time.perf_counter()
+    g.timings = {}
+    if WATCH and WATCHER is None:
+        start_watcher()
+
+
+@app.after_request
+def after_request(resp):
+    endpoint = request.endpoint or "unknown"  # (not the path, to keep the number of label-values bounded)
+    REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    REQUESTS.inc(endpoint=endpoint, status=resp.status_code)
+    if g.timings:  # shown per request in the browser's dev-tools
+        resp.headers["Server-Timing"] = ", ".join(f"{k};dur={v*1000:.2f}" for k, v in g.timings.items())
+    return resp
+
+
+@contextmanager
+def stage(name):
+    """times a stage of building the response, for /metrics and the Server-Timing header"""
+    tic = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - tic
+        STAGE_SECONDS.observe(duration, stage=name)
+        if has_request_context() and "timings" in g:
+            g.timings[name] = g.timings.get(name, 0) + duration
+
+
+def load_builder():
+    with stage("yaml_load"):
+        return CVBuilder(YAML_PATH)
 
 ########################################################################################
 
 
 def get_variant(args, builder=None):
-    builder = builder or CVBuilder(YAML_PATH)
+    builder = builder or load_builder()
     variants = builder.list_variants()
     defaults = builder.default_variants()
     this_variant = {}
@@ -53,8 +167,9 @@ def get_variant(args, builder=None):
     return this_variant
 
 
-def prepare_contentdict(cv_content, get_image_url, hugo_public_url, sectiontranslate, ignoresections):
-    cnt = cv_content["Basic Info"]
+def prepare_contentdict(cv_content, get_image_url, hugo_public_url, sectiontranslate, ignoresections, lazy_sections=False):
+    """if `lazy_sections`, the sections are only formatted once the template iterates over them (for streaming)"""
+    cnt = dict(cv_content["Basic Info"])  # (the built sections are cached, so don't modify them)
     cnt.update(image_link = f"{get_image_url}?name={cnt['photo'][4:-1]}",
                homepage_link = f"https://{cnt['homepage']}",
                hugo_public_url = hugo_public_url,
@@ -69,65 +184,340 @@ def prepare_contentdict(cv_content, get_image_url, hugo_public_url, sectiontrans
     unknown_ind = next(i for i, x in enumerate(cnt["sections"]) if x["sectionkey"] in after_unknown_secs)
     for sec in reversed(unknown_sections):
         cnt["sections"].insert(unknown_ind, sec)
-    cnt = update(cnt, fn=inline_edit)
+    sections = cnt.pop("sections")
+    with stage("inline_edit"):
+        cnt = HTML_PIPELINE(cnt)
+    sections = (edit_section(sec) for sec in sections)
+    cnt["sections"] = sections if lazy_sections else list(sections)
     return cnt
 
+
+def edit_section(section):
+    """inline_edit of all texts of a section, cached by its content such that only changed sections are re-rendered"""
+    key = content_hash(section)
+    if (res := SECTION_HTML_CACHE.get(key)) is None:
+        with stage("inline_edit"):
+            res = HTML_PIPELINE(section)
+        SECTION_HTML_CACHE.set(key, res)
+    return res
+
+
+def render_cache_key(kind, variant, builder):
+    """the rendered output only depends on the variant and the source files' content, so that's what we key by. The
+       YAML's version is the one the builder loaded (not the file's current one), such that output rendered from an
+       old YAML is never cached as the new version's."""
+    versions = (builder.version, VERSIONS.version(TEMPLATE_PATH)) if kind == "cv" else (builder.version,)
+    return (kind, tuple(sorted(variant.items())), versions)
+
+
+def variant_stem(variant):
+    """filename (without extension) of a precompiled variant, eg. `cat-tech_language-de_length-sh`"""
+    return "_".join(f"{k}-{v}" for k, v in sorted(variant.items()))
+
+
+def source_versions(builder):
+    """everything the rendered HTML & JSON depend on - precompiled files are only served if their manifest matches"""
+    return {"yaml": builder.version, "template": VERSIONS.version(TEMPLATE_PATH), "build": BUILD_ID,
+            "code": CODE_VERSION, "urls": {"get_image": GET_IMAGE_URL, "hugo_public": HUGO_PUBLIC_URL, "cv_css": CV_CSS_URL}}
+
+
+def cv_context(builder, variant, lazy_sections=False):
+    with stage("build_variant"):
+        cv_content = builder.build_variant(**variant, annotate_kind=True)
+    with stage("prepare_contentdict"):  # (includes inline_edit, except for lazy sections)
+        cnt = prepare_contentdict(cv_content=cv_content,
+                                  get_image_url=GET_IMAGE_URL,
+                                  hugo_public_url=HUGO_PUBLIC_URL,
+                                  sectiontranslate=SECTIONTRANSLATE,
+                                  ignoresections=IGNORE_SECTIONS,
+                                  lazy_sections=lazy_sections)
+    cnt["cv_css_path"] = CV_CSS_URL
+    cnt["live_reload_url"] = f"{BUILDER_BASE_URL}/events" if WATCH else None
+    return cnt
+
+
+def cv_template():
+    return JINJA_ENV.get_template(basename(TEMPLATE_PATH))  # compiled once, re-compiled only if the file changed
+
+
+def render_cv(builder, variant):
+    context = cv_context(builder, variant)
+    with stage("jinja_render"):
+        return cv_template().render(**context)
+
+
+def stream_cv(builder, variant):
+    """renders the HTML in chunks: the <head> (CSS, fonts) is sent out while the sections are still being formatted"""
+    stream = cv_template().stream(**cv_context(builder, variant, lazy_sections=True))
+    stream.enable_buffering(STREAM_BUFFER_SIZE)
+    return stream
+
+def stream_and_cache(chunks, key, future):
+    """streams the chunks and caches the complete HTML, which requests for the same key wait for meanwhile"""
+    rendered = []
+    with stage("jinja_stream"):  # (includes inline_edit of the lazy sections and the time waiting for the client)
+        for chunk in chunks:
+            rendered.append(chunk)
+            yield chunk
+    RENDER_CACHE.set(key, html := "".join(rendered))
+    RENDER_FLIGHTS.resolve(key, future, html)
+
+
+def cached_render(key, render_fn, *args):
+    """the output from the render-cache, or rendered by `render_fn(*args)` - only once for concurrent requests"""
+    if (res := RENDER_CACHE.get(key)) is None:
+        res = RENDER_FLIGHTS.do(key, render_into_cache, key, render_fn, *args)
+    return res
+
+def render_into_cache(key, render_fn, *args):
+    if (res := RENDER_CACHE.get(key)) is None:  # (another request may have finished rendering just before)
+        res = render_fn(*args)
+        RENDER_CACHE.set(key, res)
+    return res
+
+
+def render_yaml(builder, variant):
+    with stage("build_variant"):
+        yaml = builder.build_variant(**variant)
+    return app.json.response(yaml).get_data()
+
+
+def render_tex(builder, variant):
+    with stage("build_tex"):
+        return build_tex(builder, variant, site_base=PDF_SITE_BASE, include_closing=False)
+
+
+def cached_pdf(tex):
+    """path of the PDF for this LaTeX-source, compiled (in the background pool) only if it isn't cached yet. The cache
+       is content-addressed by the source & images, and concurrent requests for the same PDF share one compilation"""
+    fingerprint = pdf_fingerprint(tex, latex_assets(tex, IMAGE_INDEX), file_hash=VERSIONS.version)
+    if not isfile(path := join(PDF_CACHE_DIR, f"{fingerprint}.pdf")):
+        PDF_FLIGHTS.do(fingerprint, compile_into_cache, tex, path, executor=PDF_POOL)
+    return path, fingerprint
+
+
+@stage("pdf_compile")
+def compile_into_cache(tex, path):
+    makedirs(PDF_CACHE_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=PDF_CACHE_DIR) as tmpdir:
+        tex_path = join(tmpdir, "cv.tex")
+        with open(tex_path, "w", encoding="utf-8") as wfile:
+            wfile.write(tex)
+        replace(compile_pdf(tex_path, img_root=IMG_ROOT), path)  # (atomic, so a PDF in the cache is always complete)
+    return path
+
+
+def prebuilt_file(builder, variant, ext):
+    """path of the precompiled file for this variant if it exists and was built from the current sources, else None"""
+    if WATCH or not PREBUILT_ROOT or not isfile(manifest_path := join(PREBUILT_ROOT, "manifest.json")):
+        return None
+    manifest = MANIFEST_CACHE.get(manifest_path)
+    fname = f"{variant_stem(variant)}.{ext}"
+    if manifest["versions"] != source_versions(builder) or fname not in manifest["files"]:
+        return None
+    return join(PREBUILT_ROOT, fname)
+
+
+def conditional_response(rv, key, sources, max_age):
+    """adds an ETag (hash of the render_cache_key, so of the variant & source versions), Last-Modified (of the source
+       files) and Cache-Control to the response, which becomes a 304 if the client already has this version"""
+    resp = make_response(rv)
+    resp.set_etag(hashlib.sha1(repr((key, BUILD_ID, CODE_VERSION)).encode("utf-8")).hexdigest())
+    resp.last_modified = max(getmtime(i) for i in sources)
+    resp.cache_control.public = True
+    resp.cache_control.max_age = max_age
+    resp.implicit_sequence_conversion = False  # (else a streamed body is buffered completely for its Content-Length)
+    return resp.make_conditional(request)
+
+
+def start_watcher():
+    """(watch-mode) starts watching the YAML, template, CSS and images"""
+    global WATCHER
+    with _watcher_lock:
+        if WATCHER is None:
+            WATCHER = Watcher([YAML_PATH, TEMPLATE_PATH, CV_CSS_PATH, IMG_ROOT], rebuild).start()
+            logger.info("Watching for changes: %s", sorted(WATCHER.files) + WATCHER.dirs)
+    return WATCHER
+
+
+def rebuild(changed):
+    """(watch-mode) re-renders the recently requested variants if the YAML or template changed, and only then tells
+       the open pages to reload - so they get the new version straight from the render-cache"""
+    changed_kinds = {"yaml" if i == abspath(YAML_PATH) else "template" if i == abspath(TEMPLATE_PATH) else
+                     "css" if i == abspath(CV_CSS_PATH) else "image" for i in changed}
+    logger.info("Changed: %s", ", ".join(sorted(changed)))
+    if changed_kinds & {"yaml", "template"}:
+        try:
+            builder = load_builder()
+            with app.app_context():
+                for kind, variant in RECENT_VARIANTS.keys():
+                    cached_render(render_cache_key(kind, dict(variant), builder), render_cv if kind == "cv" else render_yaml, builder, dict(variant))
+        except Exception:  # eg. an invalid YAML while editing - keep the old page until it's fixed
+            logger.exception("Rebuilding failed")
+            return
+    LIVE_RELOAD.publish(json.dumps({"changed": sorted(changed_kinds)}))
+
 ########################################################################################
 
 
 @app.route('/getimage')
 def get_image():
-    fname = join(IMG_ROOT, request.args.get("name"))
-    if not isfile(fname):
-        fname = [i for i in listdir(IMG_ROOT) if splitext(i)[0] == request.args.get("name")]
-        if len(fname) < 1:
-            return ""
-        fname = join(IMG_ROOT, fname[0])
-    return send_file(fname, mimetype='image/gif')
+    name = request.args.get("name") or ""
+    fname = IMAGE_INDEX.get(name) or safe_join(IMG_ROOT, name)  # (the latter for files in subdirectories)
+    if fname is None or not isfile(fname) or any(i.startswith(".") for i in relpath(fname, IMG_ROOT).split(sep)):
+        abort(404)  # (hidden files, like `.linkcheck.json`, aren't served)
+    # `?w=200&dpr=2` gives a rendition 200 CSS-pixels wide for 2x-screens, as AVIF/WebP if the client accepts that
+    try:
+        fname, mimetype = rendition(fname, VERSIONS.version(fname), IMAGE_CACHE_DIR, request.args.get("w", type=int),
+                                    request.args.get("dpr", 1.0, type=float), request.accept_mimetypes)
+    except OSError as e:  # eg. a corrupt image, or a full disk - the original is better than nothing
+        logger.warning("Could not resize %s: %s", fname, e)
+        mimetype = None
+    # send_file handles If-None-Match/If-Modified-Since/Range-requests (and guesses the mimetype of originals)
+    resp = send_file(fname, mimetype=mimetype, etag=VERSIONS.version(fname), max_age=MAX_AGE_IMAGE)
+    resp.vary.add("Accept")
+    return resp
 
 @app.route('/cv.css')
 def cv_style():
-    cssfile = join(dirname(__file__), "static", "cv.css")
-    return send_file(cssfile)
+    return send_file(CV_CSS_PATH, etag=VERSIONS.version(CV_CSS_PATH), max_age=MAX_AGE_CSS)
+
+
+@app.route("/cv.pdf")
+@cross_origin(supports_credentials=True)
+def get_cv_pdf():
+    builder = load_builder()
+    variant = get_variant(request.args, builder)
+    key = ("pdf", tuple(sorted(variant.items())), (builder.version, VERSIONS.version(TEX_TEMPLATE_PATH)))
+    tex = cached_render(key, render_tex, builder, variant)
+    try:
+        path, fingerprint = cached_pdf(tex)
+    except RuntimeError as e:  # eg. no TeX installed, or the LaTeX doesn't compile
+        logger.error("%s", e)
+        return make_response("Error 500! Could not compile the PDF.", 500)
+    return send_file(path, mimetype="application/pdf", etag=fingerprint, max_age=MAX_AGE_PDF,
+                     download_name=f"cv_{variant_stem(variant)}.pdf")
+
+
+CACHES = {"yaml": YAML_CACHE, "render": RENDER_CACHE, "ir": IR_CACHE, "sections": SECTION_CACHE,
+          "section_html": SECTION_HTML_CACHE, "tex_sections": TEX_SECTION_CACHE}
+CACHED_FUNCTIONS = {"tokenize": tokenize, "inline_edit": inline_edit}  # (functools.lru_cache)
+FLIGHTS = {"render": RENDER_FLIGHTS, "pdf": PDF_FLIGHTS}
+
+
+def all_cache_stats():
+    """stats of every cache in CACHES & CACHED_FUNCTIONS, and of the FLIGHTS - for /cachestats and /metrics"""
+    caches = {name: cache.stats() for name, cache in CACHES.items()}
+    for name, fn in CACHED_FUNCTIONS.items():
+        info = fn.cache_info()
+        caches[name] = {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+    return caches, {name: flight.stats() for name, flight in FLIGHTS.items()}
+
+
+@app.route("/cachestats")
+def cache_stats():
+    caches, flights = all_cache_stats()
+    return {**caches, "flights": flights}
+
+
+@METRICS.add_collector
+def collect_cache_stats():
+    caches, flights = all_cache_stats()
+    for name, stats in caches.items():
+        CACHE_HITS.set(stats["hits"], cache=name)
+        CACHE_MISSES.set(stats["misses"], cache=name)
+        CACHE_SIZE.set(stats.get("size", stats.get("files")), cache=name)
+    YAML_PARSE_SECONDS.set(caches["yaml"]["reload_time"])
+    for name, stats in flights.items():
+        FLIGHT_CALLS.set(stats["calls"], kind=name)
+        FLIGHT_COALESCED.set(stats["coalesced"], kind=name)
+        FLIGHT_RUNNING.set(stats["in_flight"], kind=name)
+
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus text format, per worker-process"""
+    return app.response_class(METRICS.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.route("/events")
+def events():
+    """(watch-mode) server-sent events that tell the page to reload, once the new version is rendered"""
+    if not WATCH:
+        abort(404)
+    def stream(q):
+        try:
+            yield "retry: 1000\n\n"
+            while True:
+                try:
+                    yield f"data: {q.get(timeout=15)}\n\n"
+                except queue.Empty:
+                    yield ": keepalive\n\n"  # (also notices closed connections)
+        finally:
+            LIVE_RELOAD.unsubscribe(q)
+    return app.response_class(stream(LIVE_RELOAD.subscribe()), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 @app.route("/listvariants")
 @cross_origin(supports_credentials=True)
 def list_variants():
-    builder = CVBuilder(YAML_PATH)
+    builder = load_builder()
     return builder.list_variants()
 
 
 @app.route("/getyaml", methods=['GET'])
 @cross_origin(supports_credentials=True)
 def get_yaml():
-    builder = CVBuilder(YAML_PATH)
-    print("Request Args:", dict(request.args))
+    builder = load_builder()
     variant = get_variant(request.args, builder)
-    print("Used variant:", variant)
-    yaml = builder.build_variant(**variant)
-    return yaml
+    logger.debug("Request args: %s, used variant: %s", request.args, variant)
+    key = render_cache_key("yaml", variant, builder)
+    RECENT_VARIANTS.set(("yaml", key[1]), True)
+    sources = [YAML_PATH]
+    if (resp := conditional_response("", key, sources, MAX_AGE_YAML)).status_code == 304:
+        return resp
+    if (fname := prebuilt_file(builder, variant, "json")) is not None:
+        return conditional_response(send_file(fname, mimetype=app.json.mimetype, conditional=False, max_age=MAX_AGE_YAML), key, sources, MAX_AGE_YAML)
+    data = cached_render(key, render_yaml, builder, variant)
+    return conditional_response(app.response_class(data, mimetype=app.json.mimetype), key, sources, MAX_AGE_YAML)
 
 
 @app.route("/cv", methods=['GET'])
 @cross_origin(supports_credentials=True)
 def get_cv():
-    builder = CVBuilder(YAML_PATH)
+    builder = load_builder()
     variant = get_variant(request.args, builder)
-    cv_content = builder.build_variant(**variant, annotate_kind=True)
+    key = render_cache_key("cv", variant, builder)
+    RECENT_VARIANTS.set(("cv", key[1]), True)
+    sources = [YAML_PATH, TEMPLATE_PATH]
+    if (resp := conditional_response("", key, sources, MAX_AGE_CV)).status_code == 304:
+        return resp  # the client's version is still up to date, no need to render anything
+    if (fname := prebuilt_file(builder, variant, "html")) is not None:
+        return conditional_response(send_file(fname, mimetype="text/html", conditional=False, max_age=MAX_AGE_CV), key, sources, MAX_AGE_CV)
+    if STREAM_HTML and RENDER_CACHE.get(key) is None:
+        future, leader = RENDER_FLIGHTS.claim(key)
+        if leader:
+            resp = app.response_class(stream_and_cache(stream_cv(builder, variant), key, future), mimetype="text/html")
+            # (if the client disconnects before the end, the waiting requests render it themselves)
+            resp.call_on_close(lambda: RENDER_FLIGHTS.resolve(key, future, exception=RuntimeError("streaming was aborted")))
+            return conditional_response(resp, key, sources, MAX_AGE_CV)
+        try:
+            return conditional_response(future.result(), key, sources, MAX_AGE_CV)
+        except RuntimeError:
+            pass
+    html = cached_render(key, render_cv, builder, variant)
+    return conditional_response(html, key, sources, MAX_AGE_CV)
 
-    with open(TEMPLATE_PATH) as rfile:
-        tmpl = Template(rfile.read())
-
-    cnt = prepare_contentdict(cv_content=cv_content,
-                              get_image_url=GET_IMAGE_URL,
-                              hugo_public_url=HUGO_PUBLIC_URL,
-                              sectiontranslate=SECTIONTRANSLATE,
-                              ignoresections=IGNORE_SECTIONS)
-    cnt["cv_css_path"] = CV_CSS_URL
-    html = tmpl.render(**cnt)
 
-    return html
+@click.command("watch")
+@click.option("--host", default="0.0.0.0")
+@click.option("--port", default=FLASK_RUN_PORT, type=int)
+def watch_command(host, port):
+    """Dev-server that rebuilds on changes of the YAML, template, CSS and images and reloads open pages."""
+    global WATCH
+    WATCH = True
+    start_watcher()
+    run_simple(host, port, app, threaded=True)  # (app.run refuses to run inside the flask-CLI)
 
 ####################################################################################
 
@@ -0,0 +1,17 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def cv_path(tmp_path):
+    """a copy of sample_cv.yaml that the test may edit"""
+    path = tmp_path / "cv.yaml"
+    shutil.copy(os.path.join(ROOT, "sample_cv.yaml"), path)
+    return str(path)
+
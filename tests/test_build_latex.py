@@ -0,0 +1,27 @@
+import json
+import os
+
+import pytest
+
+from build_latex import CV2LaTeX, build_tex
+from cv_builder import CVBuilder
+
+# outputs of the formatter before inline markdown was converted in a single scan (chained replaces & a char-by-char
+# quote loop): the sample CV, hand-written cases for bold/italics, links, quotes, bullets & escaping, plus random ones
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), "golden")
+with open(os.path.join(GOLDEN_DIR, "latex_text.json"), encoding="utf-8") as rfile:
+    GOLDEN = json.load(rfile)
+FORMATTER = CV2LaTeX({}, "", site_base="https://cstenkamp.de")
+
+
+@pytest.mark.parametrize("language", ["en", "de"])
+def test_sample_cv(language):
+    with open(os.path.join(GOLDEN_DIR, f"sample_cv.{language}.tex"), encoding="utf-8") as rfile:
+        expected = rfile.read()
+    builder = CVBuilder(os.path.join(os.path.dirname(GOLDEN_DIR), "..", "sample_cv.yaml"))
+    assert build_tex(builder, {"language": language}, include_closing=False) == expected
+
+
+@pytest.mark.parametrize("fn,text,expected", [(fn, text, expected) for fn, cases in GOLDEN.items() for text, expected in cases])
+def test_text_formatting(fn, text, expected):
+    assert getattr(FORMATTER, fn)(text) == expected
@@ -0,0 +1,26 @@
+import hashlib
+
+from util.cache import FileCache, Snapshots
+
+
+def test_load_returns_content_and_hash_of_the_same_version(tmp_path):
+    path = tmp_path / "data.txt"
+    path.write_text("one")
+    cache = FileCache(lambda raw: raw.decode())
+    assert cache.load(str(path)) == ("one", hashlib.sha1(b"one").hexdigest())
+    path.write_text("two!")
+    obj, version = cache.load(str(path))
+    assert (obj, version) == ("two!", hashlib.sha1(b"two!").hexdigest())
+    assert cache.stats()["reloads"] == 1
+
+
+def test_snapshots_are_used_for_the_same_content_only(tmp_path):
+    path = tmp_path / "data.txt"
+    path.write_text("one")
+    snapshots = Snapshots(str(tmp_path / "snapshots"))
+    FileCache(lambda raw: raw.decode(), snapshots).get(str(path))
+    assert snapshots.stats() == {"hits": 0, "writes": 1}
+    assert FileCache(lambda raw: 1 / 0, snapshots).get(str(path)) == "one"  # (loaded, not parsed)
+    path.write_text("two")
+    assert FileCache(lambda raw: raw.decode(), snapshots).get(str(path)) == "two"
+    assert snapshots.stats() == {"hits": 1, "writes": 2}
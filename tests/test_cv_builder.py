@@ -0,0 +1,40 @@
+import cv_builder
+from cv_builder import CVBuilder
+from util.cache import Snapshots
+
+
+def edit(path, old, new):
+    with open(path) as rfile:
+        content = rfile.read()
+    assert old in content
+    with open(path, "w") as wfile:
+        wfile.write(content.replace(old, new))
+
+
+def test_builder_keeps_the_version_it_loaded(cv_path):
+    builder = CVBuilder(cv_path)
+    version = builder.version
+    edit(cv_path, "Doe", "Roe")
+    assert builder.version == version
+    assert CVBuilder(cv_path).version != version
+
+
+def test_edit_during_build_doesnt_poison_the_caches(cv_path):
+    old = CVBuilder(cv_path)
+    edit(cv_path, "Doe", "Roe")
+    assert "Doe" in repr(old.build_variant(language="en"))  # the old builder computes its section-hashes now
+    assert "Roe" in repr(CVBuilder(cv_path).build_variant(language="en"))
+
+
+def test_compiled_sections_are_restored_from_the_snapshot(cv_path, tmp_path, monkeypatch):
+    snapshots = Snapshots(str(tmp_path / "snapshots"))
+    monkeypatch.setattr(cv_builder, "IR_SNAPSHOTS", snapshots)
+    cv_builder.IR_CACHE.clear()
+    cv_builder.SECTION_CACHE.clear()
+    expected = CVBuilder(cv_path).build_variant(language="de")
+    assert snapshots.stats() == {"hits": 0, "writes": 1}
+    cv_builder.IR_CACHE.clear()  # (like a new process)
+    cv_builder.SECTION_CACHE.clear()
+    monkeypatch.setattr(cv_builder, "compile_value", None)
+    assert CVBuilder(cv_path).build_variant(language="de") == expected
+    assert snapshots.stats() == {"hits": 1, "writes": 1}
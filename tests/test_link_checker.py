@@ -0,0 +1,72 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from util.link_checker import LinkChecker
+
+
+class Handler(BaseHTTPRequestHandler):
+    requests = []
+
+    def respond(self):
+        Handler.requests.append((self.command, self.path))
+        if self.path == "/slow":
+            time.sleep(1)
+        status = {"/ok": 200, "/slow": 200, "/redirect": 302}.get(self.path, 404)
+        self.send_response(status)
+        if status == 302:
+            self.send_header("Location", "/ok")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_HEAD = do_GET = respond
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def check(cache_path, urls):
+    checker = LinkChecker(cache_path=str(cache_path), timeout=0.3)
+    try:
+        return checker.check(urls)
+    finally:
+        checker.close()
+
+
+def test_results_are_deduplicated_and_cached(server, tmp_path):
+    cache_path = tmp_path / "links.json"
+    urls = [f"{server}/ok", f"{server}/missing", f"{server}/redirect", f"{server}/ok"]
+    assert check(cache_path, urls) == [(f"{server}/missing", 404, False), (f"{server}/ok", 200, True), (f"{server}/redirect", 200, True)]
+    assert Handler.requests.count(("HEAD", "/ok")) == 2  # (once directly, once as the target of the redirect)
+    assert ("GET", "/missing") in Handler.requests  # re-checked with GET, as some servers don't support HEAD
+    n_requests = len(Handler.requests)
+    assert check(cache_path, urls) == check(cache_path, list(reversed(urls)))
+    assert len(Handler.requests) == n_requests
+    assert set(json.loads(cache_path.read_text())) == set(urls)
+
+
+def test_errors_arent_cached_for_long(server, tmp_path):
+    cache_path = tmp_path / "links.json"
+    assert check(cache_path, [f"{server}/slow"]) == [(f"{server}/slow", None, False)]
+    assert check(cache_path, [f"{server}/slow"]) == [(f"{server}/slow", None, False)]  # (within the error_ttl)
+    assert Handler.requests.count(("HEAD", "/slow")) == 1
+    checker = LinkChecker(cache_path=str(cache_path), error_ttl=0)
+    assert not checker.is_fresh(f"{server}/slow")
+
+
+def test_unwritable_cache_doesnt_fail_the_check(server, tmp_path):
+    cache_path = tmp_path / "missing_dir" / "links.json"
+    assert check(cache_path, [f"{server}/ok"]) == [(f"{server}/ok", 200, True)]
@@ -0,0 +1,22 @@
+import hashlib
+import json
+
+import precompile
+import serve
+from test_cv_builder import edit
+
+
+def test_precompile_replaces_a_previous_build(cv_path, tmp_path, monkeypatch):
+    edit(cv_path, "  photo:", "  homepage:   example.org\n  photo:")  # (needed by the HTML template)
+    monkeypatch.setattr(serve, "YAML_PATH", cv_path)
+    monkeypatch.setattr(precompile, "all_variants", lambda builder: [{"language": "en"}])  # (the sample's german HTML needs more sections)
+    out_dir = tmp_path / "prebuilt"
+    out_dir.mkdir()
+    (out_dir / "manifest.json").write_text(json.dumps({"versions": {}, "files": {}, "pdf_sources": {}}))
+    (out_dir / "language-en.html").write_text("old")
+    precompile.precompile(str(out_dir), processes=1, with_tex=False)
+    manifest = json.loads((out_dir / "manifest.json").read_text())
+    assert manifest["versions"] == serve.source_versions(serve.CVBuilder(cv_path))
+    for fname, digest in manifest["files"].items():
+        assert hashlib.sha1((out_dir / fname).read_bytes()).hexdigest() == digest
+    assert not list(out_dir.glob("*.tmp")) and not list(out_dir.glob(".*.tmp"))
@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+import serve
+from test_cv_builder import edit
+
+
+@pytest.fixture
+def client(cv_path, monkeypatch):
+    monkeypatch.setattr(serve, "YAML_PATH", cv_path)
+    serve.RENDER_CACHE.clear()
+    return serve.app.test_client()
+
+
+def test_output_of_an_old_yaml_isnt_cached_as_the_new_version(client, cv_path):
+    builder = serve.load_builder()
+    edit(cv_path, "Doe", "Roe")
+    variant = serve.get_variant({}, builder)
+    old = serve.cached_render(serve.render_cache_key("yaml", variant, builder), serve.render_yaml, builder, variant)
+    assert b"Doe" in old
+    assert "Roe" in json.dumps(client.get("/getyaml").json)
+
+
+@pytest.fixture
+def img_root(tmp_path, monkeypatch):
+    root = tmp_path / "img"
+    root.mkdir()
+    (root / "all_cvs.yaml").write_text("not: an image\n")
+    monkeypatch.setattr(serve, "IMG_ROOT", str(root))
+    monkeypatch.setattr(serve, "IMAGE_INDEX", serve.DirectoryIndex(str(root)))
+    monkeypatch.setattr(serve, "IMAGE_CACHE_DIR", str(tmp_path / "renditions"))
+    return root
+
+
+def test_resizing_a_non_image_sends_the_original(client, img_root):
+    resp = client.get("/getimage?name=all_cvs&w=100")
+    assert resp.status_code == 200
+    assert resp.data == b"not: an image\n"
+
+
+def test_images_are_resized(client, img_root):
+    Image = pytest.importorskip("PIL.Image")
+    Image.new("RGB", (400, 200), "red").save(img_root / "photo.png")
+    resp = client.get("/getimage?name=photo&w=100", headers={"Accept": "image/jpeg"})
+    assert resp.status_code == 200 and resp.mimetype == "image/jpeg"
+
+
+def test_hidden_files_arent_served(client, img_root):
+    (img_root / ".linkcheck.json").write_text("{}")
+    (img_root / ".hidden").mkdir()
+    (img_root / ".hidden" / "photo.png").write_bytes(b"x")
+    assert client.get("/getimage?name=.linkcheck.json").status_code == 404
+    assert client.get("/getimage?name=.linkcheck").status_code == 404
+    assert client.get("/getimage?name=.hidden/photo.png").status_code == 404
+    assert client.get("/getimage?name=all_cvs.yaml").status_code == 200
+
+
+@pytest.mark.parametrize("setting", ["BUILD_ID", "CODE_VERSION", "GET_IMAGE_URL", "CV_CSS_URL", "HUGO_PUBLIC_URL"])
+def test_prebuilt_files_of_another_deployment_arent_served(cv_path, tmp_path, monkeypatch, setting):
+    builder = serve.CVBuilder(cv_path)
+    variant = serve.get_variant({}, builder)
+    fname = f"{serve.variant_stem(variant)}.html"
+    (tmp_path / fname).write_text("<html/>")
+    (tmp_path / "manifest.json").write_text(json.dumps({"versions": serve.source_versions(builder), "files": {fname: ""}}))
+    monkeypatch.setattr(serve, "PREBUILT_ROOT", str(tmp_path))
+    monkeypatch.setattr(serve, "WATCH", False)
+    assert serve.prebuilt_file(builder, variant, "html") == str(tmp_path / fname)
+    monkeypatch.setattr(serve, setting, "https://elsewhere.example")
+    assert serve.prebuilt_file(builder, variant, "html") is None
+
+
+def test_cachestats_and_metrics_report_the_same_caches(client):
+    stats = client.get("/cachestats").json
+    metrics = client.get("/metrics").data.decode()
+    assert set(stats) - {"flights"} == set(serve.CACHES) | set(serve.CACHED_FUNCTIONS)
+    for name in set(stats) - {"flights"}:
+        assert f'cv_cache_hits_total{{cache="{name}"}}' in metrics
+    for name in stats["flights"]:
+        assert f'cv_singleflight_calls_total{{kind="{name}"}}' in metrics
+
+
+def test_streamed_cv_isnt_buffered(client, cv_path, monkeypatch):
+    edit(cv_path, "  photo:", "  homepage:   example.org\n  photo:")  # (needed by the HTML template)
+    expected = client.get("/cv").data
+    serve.RENDER_CACHE.clear()
+    monkeypatch.setattr(serve, "STREAM_HTML", True)
+    resp = client.get("/cv", buffered=False)
+    assert resp.is_streamed and "Content-Length" not in resp.headers
+    assert resp.get_data() == expected
+    assert client.get("/cv", headers={"If-None-Match": resp.headers["ETag"]}).status_code == 304
+
+
+def test_etags_change_with_the_code(client, monkeypatch):
+    etag = client.get("/getyaml").headers["ETag"]
+    monkeypatch.setattr(serve, "CODE_VERSION", "another")
+    resp = client.get("/getyaml", headers={"If-None-Match": etag})
+    assert resp.status_code == 200 and resp.headers["ETag"] != etag
+
+
+def test_cached_pdfs_dont_read_the_images_again(img_root, tmp_path, monkeypatch):
+    (img_root / "photo.png").write_bytes(b"one")
+    monkeypatch.setattr(serve, "VERSIONS", serve.FileCache(lambda raw: None))
+    monkeypatch.setattr(serve, "PDF_CACHE_DIR", str(tmp_path / "pdfs"))
+    monkeypatch.setattr(serve, "compile_into_cache", lambda tex, path: (serve.makedirs(serve.PDF_CACHE_DIR, exist_ok=True), open(path, "wb").close()))
+    tex = r"\photo{photo}"
+    path, fingerprint = serve.cached_pdf(tex)
+    assert serve.cached_pdf(tex) == (path, fingerprint)
+    assert serve.VERSIONS.stats()["misses"] == 1  # (the photo was only read once)
+    (img_root / "photo.png").write_bytes(b"a new photo")
+    assert serve.cached_pdf(tex)[1] != fingerprint
@@ -0,0 +1,33 @@
+import json
+import os
+
+import pytest
+
+from jinja_cv_html import remove_forbidtexts
+from util.text_util import split_into_sentences
+
+# outputs of the original implementation (which applied the substitutions of https://stackoverflow.com/a/31505798 one
+# after another): hand-written cases for abbreviations, numbers, quotes, ellipses & forbidden texts, plus random ones
+with open(os.path.join(os.path.dirname(__file__), "golden", "sentences.json"), encoding="utf-8") as rfile:
+    GOLDEN = json.load(rfile)
+
+
+@pytest.mark.parametrize("text,expected", GOLDEN["split_into_sentences"])
+def test_split_into_sentences(text, expected):
+    assert split_into_sentences(text) == expected
+
+
+@pytest.mark.parametrize("text,expected", GOLDEN["remove_forbidtexts"])
+def test_remove_forbidtexts(text, expected):
+    assert remove_forbidtexts(text) == expected
+
+
+# the original split its own output again for the second phrase, which could split differently - now all sentences
+# with any of the phrases are removed in one pass
+@pytest.mark.parametrize("text,expected", GOLDEN["remove_forbidtexts_both_phrases"])
+def test_remove_forbidtexts_with_both_phrases(text, expected):
+    assert remove_forbidtexts(text) == expected
+
+
+def test_phrase_across_sentences_isnt_removed():
+    assert remove_forbidtexts("I handed. In 2020 it ended.") == "I handed. In 2020 it ended."
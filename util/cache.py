@@ -0,0 +1,245 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+def content_hash(obj):
+    """hash of a (nested) parsed object, eg. a subtree of the YAML - relies on its repr being deterministic"""
+    return hashlib.sha1(repr(obj).encode("utf-8")).hexdigest()
+
+
+class Snapshots():
+    """Pickled snapshots of parsed files in `directory`, keyed by the content hash of the file, such that new processes
+       (CLI-builds, gunicorn-workers) can load them instead of parsing the file again. Outdated, unreadable or
+       unwritable snapshots are ignored. As unpickling can run arbitrary code, `directory` must be private (so not
+       next to the data, which is served by /getimage)!"""
+
+    def __init__(self, directory, suffix=".snapshot"):
+        self.directory = directory
+        self.suffix = suffix
+        self.hits = self.writes = 0
+
+    def path(self, path):
+        """`cv.yaml.<hash of its absolute path>.snapshot`, so files with the same name in other directories don't clash"""
+        path = os.path.abspath(path)
+        return os.path.join(self.directory, f"{os.path.basename(path)}.{hashlib.sha1(path.encode()).hexdigest()[:12]}{self.suffix}")
+
+    def load(self, path, digest):
+        """the snapshotted object for the file with content hash `digest`, or None"""
+        try:
+            with open(self.path(path), "rb") as rfile:
+                if rfile.readline() != digest.encode("ascii") + b"\n":
+                    return None
+                obj = pickle.load(rfile)
+        except Exception:  # (missing, truncated, or written by an incompatible version)
+            return None
+        self.hits += 1
+        return obj
+
+    def save(self, path, digest, obj):
+        snapshot_path = self.path(path)
+        tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"  # (several workers may write it at once)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, "wb") as wfile:
+                wfile.write(digest.encode("ascii") + b"\n")
+                pickle.dump(obj, wfile, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, snapshot_path)
+        except (OSError, pickle.PicklingError):  # eg. a read-only directory
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self.writes += 1
+
+    def stats(self):
+        return {"hits": self.hits, "writes": self.writes}
+
+
+class FileCache():
+    """Process-wide cache of parsed files, keyed by absolute path. A file is only re-parsed if its content changed:
+       first the (mtime, size) is compared, and only if that differs the content hash is checked as well (so touching
+       a file doesn't trigger a re-parse). With `snapshots`, new processes load the parsed content from there instead
+       of parsing it. The cached objects are shared, so treat them as read-only!"""
+
+    def __init__(self, parse_fn, snapshots=None):
+        self.parse_fn = parse_fn
+        self.snapshots = snapshots
+        self._entries = {}  # path -> {"stat": (mtime_ns, size), "hash": str, "obj": parsed}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.reloads = 0
+        self.reload_time = 0.0  # total seconds spent parsing (or loading snapshots)
+
+    def get(self, path):
+        return self._get_entry(path)["obj"]
+
+    def version(self, path):
+        """content hash of the currently cached version of the file"""
+        return self._get_entry(path)["hash"]
+
+    def load(self, path):
+        """(parsed content, its content hash) - from the same version of the file, unlike separate `get` & `version`"""
+        entry = self._get_entry(path)
+        return entry["obj"], entry["hash"]
+
+    def _get_entry(self, path):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        stat = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry["stat"] == stat:
+                self.hits += 1
+                return entry
+            with open(path, "rb") as rfile:
+                raw = rfile.read()
+            digest = hashlib.sha1(raw).hexdigest()
+            if entry is not None and entry["hash"] == digest:
+                entry["stat"] = stat
+                self.hits += 1
+                return entry
+            tic = time.perf_counter()
+            obj = self.snapshots.load(path, digest) if self.snapshots is not None else None
+            if obj is None:
+                obj = self.parse_fn(raw)
+                if self.snapshots is not None:
+                    self.snapshots.save(path, digest, obj)
+            self.reload_time += time.perf_counter() - tic
+            self.misses += 1
+            self.reloads += entry is not None
+            entry = self._entries[path] = {"stat": stat, "hash": digest, "obj": obj}
+            return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        stats = {"hits": self.hits, "misses": self.misses, "reloads": self.reloads,
+                 "reload_time": round(self.reload_time, 6), "files": len(self._entries)}
+        if self.snapshots is not None:
+            stats["snapshots"] = self.snapshots.stats()
+        return stats
+
+
+class LRUCache():
+    """Thread-safe LRU-cache with an optional time-to-live (in seconds) per entry."""
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (timestamp, value)
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl is None or time.monotonic() - entry[0] < self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def keys(self):
+        """the current keys, least recently used first (expired ones included)"""
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize, "ttl": self.ttl}
+
+
+class DirectoryIndex():
+    """Maps file names and file stems (name without extension) of a directory to their paths. The directory is only
+       listed again if its mtime changed (ie. a file was added, removed or renamed)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        with self._lock:
+            if mtime != self._mtime:
+                index = {}
+                for fname in sorted(os.listdir(self.path), reverse=True):  # reversed, so the first one wins for equal stems
+                    if os.path.isfile(fpath := os.path.join(self.path, fname)):
+                        index[os.path.splitext(fname)[0]] = index[fname] = fpath
+                self._index, self._mtime = index, mtime
+        return self._index
+
+    def get(self, name):
+        """path of the file with this name or stem, or None"""
+        return self._refresh().get(name)
+
+
+class SingleFlight():
+    """Coalesces concurrent calls with the same key: while a call is running, further calls with that key wait for
+       its result (or exception) instead of running it again. With an `executor`, the call runs there."""
+
+    def __init__(self):
+        self._futures = {}  # key -> Future of the running call
+        self._lock = threading.Lock()
+        self.calls = self.coalesced = 0
+
+    def do(self, key, fn, *args, executor=None):
+        future, leader = self.claim(key)
+        if leader:
+            if executor is None:
+                self._run(key, future, fn, args)
+            else:
+                executor.submit(self._run, key, future, fn, args)
+        return future.result()
+
+    def claim(self, key):
+        """returns (future, leader) - only the leader does the work, and has to `resolve` the future afterwards"""
+        with self._lock:
+            if (future := self._futures.get(key)) is not None:
+                self.coalesced += 1
+                return future, False
+            self.calls += 1
+            future = self._futures[key] = Future()
+            return future, True
+
+    def resolve(self, key, future, result=None, exception=None):
+        """sets the result for all waiting calls (does nothing if it was resolved already)"""
+        with self._lock:
+            if future.done():
+                return
+            if self._futures.get(key) is future:
+                del self._futures[key]
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+
+    def _run(self, key, future, fn, args):
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            self.resolve(key, future, exception=e)
+        else:
+            self.resolve(key, future, result)
+
+    def stats(self):
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._futures)}
@@ -0,0 +1,71 @@
+import math
+import os
+import threading
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional, without it the images are served as they are
+    Image = None
+
+if Image is not None:
+    Image.init()
+    # (mimetype, Pillow-format, extension, save-kwargs), in order of preference if the client accepts several
+    MODERN_FORMATS = [i for i in [("image/avif", "AVIF", "avif", dict(quality=60)),
+                                  ("image/webp", "WEBP", "webp", dict(quality=80, method=4))] if i[1] in Image.SAVE]
+JPEG = ("image/jpeg", "JPEG", "jpg", dict(quality=85, optimize=True, progressive=True))
+PNG = ("image/png", "PNG", "png", dict(optimize=True))
+
+MAX_WIDTH = 2048
+WIDTH_STEP = 50  # requested widths are rounded up to multiples of this, so there's only a limited number of renditions
+
+
+def negotiate_format(accept, has_alpha=False):
+    """best format that the client explicitly accepts (`*/*` doesn't count, as browsers send that even if they don't
+       support AVIF) - JPEG (or PNG for transparent images) as fallback. `accept` is werkzeug's `request.accept_mimetypes`."""
+    accepted = {value for value, quality in accept or () if quality > 0}
+    for fmt in MODERN_FORMATS:
+        if fmt[0] in accepted:
+            return fmt
+    return PNG if has_alpha else JPEG
+
+
+def target_width(width, density=1.0):
+    """device-pixels for `width` CSS-pixels at `density`, rounded up to WIDTH_STEP and clamped to MAX_WIDTH"""
+    if not width or width <= 0:
+        return None
+    density = min(max(density or 1.0, 1.0), 4.0)
+    return min(math.ceil(width * density / WIDTH_STEP) * WIDTH_STEP, MAX_WIDTH)
+
+
+def rendition(src_path, src_hash, cache_dir, width=None, density=1.0, accept=None):
+    """Returns (path, mimetype) of the image resized to `width` CSS-pixels at `density` and encoded in the best format
+       the client accepts. Renditions are stored as `<src_hash>_<width>.<ext>` in `cache_dir`, so each size and format
+       is only encoded once (and a changed source gets new ones). Returns (src_path, None) if Pillow isn't installed,
+       no width is requested or the file isn't an image Pillow can read."""
+    if Image is None or (pixels := target_width(width, density)) is None:
+        return src_path, None
+    try:
+        img = Image.open(src_path)
+    except OSError:  # (incl. UnidentifiedImageError) eg. the YAML, or a PDF
+        return src_path, None
+    with img:
+        has_alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+        mimetype, fmt, ext, save_kwargs = negotiate_format(accept, has_alpha)
+        pixels = min(pixels, img.width)  # never upscale
+        if pixels == img.width and fmt == img.format:
+            return src_path, None
+        path = os.path.join(cache_dir, f"{src_hash}_{pixels}.{ext}")
+        if os.path.isfile(path):
+            return path, mimetype
+        img = ImageOps.exif_transpose(img)
+        if pixels < img.width:
+            img = img.resize((pixels, round(img.height * pixels / img.width)), Image.LANCZOS)
+        if fmt == "JPEG" and img.mode != "RGB":
+            img = img.convert("RGB")
+        elif img.mode not in ("RGB", "RGBA", "L", "LA"):
+            img = img.convert("RGBA" if has_alpha else "RGB")
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"  # atomic, as workers may encode the same rendition
+        img.save(tmp_path, format=fmt, **save_kwargs)
+        os.replace(tmp_path, path)
+    return path, mimetype
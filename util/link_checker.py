@@ -0,0 +1,96 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class LinkChecker():
+    """Checks many URLs concurrently: one pooled session per host (with at most `per_host` parallel requests to it),
+       HEAD first and GET only if the server doesn't like HEAD, and results are cached in a JSON-file for `ttl` seconds,
+       such that repeated runs only re-check stale URLs. Errors (timeouts, refused connections, ...) are often transient,
+       so they are only cached for `error_ttl` seconds."""
+
+    def __init__(self, cache_path=None, ttl=24*3600, timeout=10, max_workers=16, per_host=4, error_ttl=300):
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self._sessions = {}  # host -> (session, semaphore)
+        self._lock = threading.Lock()
+        self.cache = self._load_cache()
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.isfile(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, "r") as rfile:
+                return json.load(rfile)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        tmp_path = self.cache_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as wfile:
+                json.dump(self.cache, wfile, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:  # eg. a read-only directory - the results are still returned, just not cached
+            logger.warning("Could not save the link-cache: %s", e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _session(self, host):
+        with self._lock:
+            if host not in self._sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.per_host)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[host] = (session, threading.BoundedSemaphore(self.per_host))
+            return self._sessions[host]
+
+    def probe(self, url):
+        """returns (status_code, ok) - status_code is None if the request raised an exception"""
+        session, semaphore = self._session(urlsplit(url).netloc)
+        with semaphore:
+            try:
+                r = session.head(url, timeout=self.timeout, allow_redirects=True)
+                if not r.ok:  # some servers don't support HEAD (405, 501, or even 403/404), so re-check with GET
+                    r = session.get(url, timeout=self.timeout, allow_redirects=True, stream=True)
+                    r.close()
+                return r.status_code, r.ok
+            except requests.RequestException:
+                return None, False
+
+    def is_fresh(self, url):
+        if (entry := self.cache.get(url)) is None:
+            return False
+        return time.time() - entry["checked"] < (self.ttl if entry["status"] is not None else self.error_ttl)
+
+    def check(self, urls):
+        """returns a list of (url, status_code, ok) for all urls, probing only those not freshly cached"""
+        urls = sorted(set(urls))
+        stale = [url for url in urls if not self.is_fresh(url)]
+        if stale:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                for url, (status, ok) in zip(stale, pool.map(self.probe, stale)):
+                    self.cache[url] = {"status": status, "ok": ok, "checked": time.time()}
+            self._save_cache()
+        return [(url, self.cache[url]["status"], self.cache[url]["ok"]) for url in urls]
+
+    def close(self):
+        for session, _ in self._sessions.values():
+            session.close()
+        self._sessions.clear()
@@ -0,0 +1,97 @@
+import threading
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _fmt_labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in items) + "}"
+
+
+def _fmt_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric():
+    """A counter, gauge or histogram, with one value (or set of buckets) per combination of label-values."""
+
+    def __init__(self, name, kind, help, buckets=DEFAULT_BUCKETS):
+        self.name, self.kind, self.help = name, kind, help
+        self.buckets = tuple(buckets)
+        self._values = {}  # sorted label-items -> value, or [bucket-counts, sum, count] for histograms
+        self._lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] = value
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            if (entry := self._values.get(key)) is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        with self._lock:
+            values = sorted(self._values.items())
+            if self.kind == "histogram":
+                values = [(k, ([*v[0]], v[1], v[2])) for k, v in values]
+        for labels, value in values:
+            if self.kind != "histogram":
+                yield f"{self.name}{_fmt_labels(labels)} {_fmt_value(value)}"
+                continue
+            counts, total, count = value
+            for bound, n in zip(self.buckets, counts):
+                yield f"{self.name}_bucket{_fmt_labels(labels, le=bound)} {n}"
+            yield f"{self.name}_bucket{_fmt_labels(labels, le='+Inf')} {count}"
+            yield f"{self.name}_sum{_fmt_labels(labels)} {_fmt_value(total)}"
+            yield f"{self.name}_count{_fmt_labels(labels)} {count}"
+
+
+class Registry():
+    """Metrics in the Prometheus text format. Values are per process (so with several gunicorn-workers, each one
+       reports its own). Collectors are called before rendering, eg. to copy the stats of the caches into gauges."""
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+
+    def _add(self, name, kind, help, **kwargs):
+        if name not in self.metrics:
+            self.metrics[name] = Metric(name, kind, help, **kwargs)
+        return self.metrics[name]
+
+    def counter(self, name, help):
+        return self._add(name, "counter", help)
+
+    def gauge(self, name, help):
+        return self._add(name, "gauge", help)
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        return self._add(name, "histogram", help, buckets=buckets)
+
+    def add_collector(self, fn):
+        self.collectors.append(fn)
+        return fn
+
+    def render(self):
+        for fn in self.collectors:
+            fn()
+        return "\n".join(line for metric in self.metrics.values() for line in metric.lines()) + "\n"
+
+
+METRICS = Registry()
@@ -1,51 +1,114 @@
-# https://stackoverflow.com/a/31505798/5122790
+# The rules of https://stackoverflow.com/a/31505798/5122790, which applied ~20 substitutions one after another (marking
+# full stops as `<prd>` or sentence-ends as `<stop>`). Here, every rule is a precompiled pattern that finds the full
+# stops it applies to in the unchanged text, and they are resolved in the same order - without building any strings.
 
 import re
-alphabets= "([A-Za-z])"
-prefixes = "(Mr|St|Mrs|Ms|Dr)[.]"
-suffixes = "(Inc|Ltd|Jr|Sr|Co)"
-starters = "(Mr|Mrs|Ms|Dr|Prof|Capt|Cpt|Lt|He\s|She\s|It\s|They\s|Their\s|Our\s|We\s|But\s|However\s|That\s|This\s|Wherever|www)"
-acronyms = "([A-Z][.][A-Z][.](?:[A-Z][.])?)"
-websites = "[.](com|net|org|io|gov|edu|me|de)"
-digits = "([0-9])"
-multiple_dots = r'\.{2,}'
+
+STARTERS = r"(Mr|Mrs|Ms|Dr|Prof|Capt|Cpt|Lt|He\s|She\s|It\s|They\s|Their\s|Our\s|We\s|But\s|However\s|That\s|This\s|Wherever|www)"
+
+TERMINATOR_RE = re.compile(r"[.?!]")
+# (the patterns start with the full stop and look behind it, such that the regex-engine can skip right to the next one)
+ABBREVIATION_RE = re.compile(r"\.(?:(?<=Mr\.|St\.|Ms\.|Dr\.)|(?<=Mrs\.)|(?=com|net|org|io|gov|edu|me|de))")  # "Dr.", "example.com"
+NUMBER_RE = re.compile(r"\.(?<=[0-9]\.)(?=[0-9])")  # "3.14"
+ELLIPSIS_RE = re.compile(r"\.{2,}")
+PHD_RE = re.compile(r"Ph\.D\.")
+INITIAL_RE = re.compile(r"\.(?<=\s[A-Za-z]\.)(?= )")  # " a. b"
+ACRONYM_STARTER_RE = re.compile(r"\.(?<=[A-Z]\.)[A-Z]\.(?:[A-Z]\.)? " + STARTERS)  # "U.S. He" -> sentence ends after "U.S."
+LETTER_DOTS_RE = {3: re.compile(r"\.(?<=[A-Za-z]\.)[A-Za-z]\.[A-Za-z]\."), 2: re.compile(r"\.(?<=[A-Za-z]\.)[A-Za-z]\.")}  # "e.g."
+SUFFIX_STARTER_RE = re.compile(r" (Inc|Ltd|Jr|Sr|Co)\. " + STARTERS)  # "Inc. He" -> sentence ends after "Inc"
+SUFFIX_OR_INITIAL_RE = re.compile(r"\.(?:(?<= Jr\.| Sr\.| Co\.)|(?<= Inc\.| Ltd\.)|(?<= [A-Za-z]\.))")
+QUOTE_AFTER_TERMINATOR_RE = re.compile(r'[.?!][”"]')
+QUOTE_RUN_RE = re.compile(r'[.?!”"]{2,}')
+
+
+def _search_unprotected(pattern, t, protected, dots_at):
+    """leftmost, non-overlapping matches of `pattern` whose full stops (at `dots_at(match)`) aren't protected yet"""
+    pos = 0
+    while (m := pattern.search(t, pos)) is not None:
+        if protected.isdisjoint(dots_at(m)):
+            yield m
+            pos = m.end()
+        else:
+            pos = m.start() + 1
+
+
+def _sentence_bounds(text):
+    """(normalized text or None if unchanged, [(start, end) of every sentence in the padded text]). The normalized text
+       has the same length, so the spans apply to both."""
+    t = " " + text.replace("\n", " ") + "  "
+    protected = {m.start() for m in ABBREVIATION_RE.finditer(t)}  # full stops that don't end a sentence
+    stops, dropped, respaced = [], set(), []  # additional sentence-ends; removed full stops; whitespace made a space
+    numbers = set()
+    for m in NUMBER_RE.finditer(t):
+        if m.start() - 2 not in numbers:  # in "1.2.3" only the first one, as the "2" was consumed by that match
+            numbers.add(m.start())
+    protected |= numbers
+    for m in ELLIPSIS_RE.finditer(t):  # "..." is kept together and ends the sentence
+        if len(run := [p for p in range(m.start(), m.end()) if p not in protected]) >= 2:
+            protected.update(run)
+            stops.append(run[-1] + 1)
+    for m in PHD_RE.finditer(t):
+        if m.end() - 1 not in protected:
+            protected.update((m.start() + 2, m.end() - 1))
+    initials = set()
+    for m in INITIAL_RE.finditer(t):
+        if (p := m.start()) not in protected and p - 3 not in initials:  # in " a. b. c" the space before b was consumed
+            initials.add(p)
+            if t[p-2] != " ":
+                respaced.append(p - 2)
+    protected |= initials
+    for m in _search_unprotected(ACRONYM_STARTER_RE, t, protected, lambda m: range(m.start(), m.start(1) - 1, 2)):
+        stops.append(m.start(1) - 1)
+    for n in (3, 2):
+        for m in _search_unprotected(LETTER_DOTS_RE[n], t, protected, lambda m: range(m.start(), m.end(), 2)):
+            protected.update(range(m.start(), m.end(), 2))
+    for m in _search_unprotected(SUFFIX_STARTER_RE, t, protected, lambda m: (m.end(1),)):
+        dropped.add(m.end(1))
+        stops.append(m.end(1))
+    protected |= dropped
+    protected.update(m.start() for m in SUFFIX_OR_INITIAL_RE.finditer(t))
+    terminators = {m.start() for m in TERMINATOR_RE.finditer(t)} - protected
+    # full stops, "?" and "!" before quotes are moved behind them (`."` -> `".`)
+    changes = {}
+    if QUOTE_AFTER_TERMINATOR_RE.search(t):
+        for m in QUOTE_RUN_RE.finditer(t):
+            run = "".join("\0" if i in protected else t[i] for i in range(m.start(), m.end()))
+            if (new := run.replace(".”", "”.").replace('."', '".').replace('!"', '"!').replace('?"', '"?')) != run:
+                terminators.difference_update(range(m.start(), m.end()))
+                terminators.update(m.start() + k for k, c in enumerate(new) if c in ".?!")
+                changes.update((m.start() + k, c) for k, c in enumerate(new) if c != run[k])
+    bounds = sorted([p + 1 for p in terminators] + stops)
+    spans = []
+    for start, end in zip([0] + bounds, bounds + [len(t)]):
+        while start < end and (t[start].isspace() or start in dropped):
+            start += 1
+        while end > start and t[end-1].isspace():
+            end -= 1
+        spans.append((start, end))
+    if spans and spans[-1][0] == spans[-1][1]:
+        spans.pop()
+    normalized = None
+    if respaced or changes:
+        chars = list(t)
+        for i in respaced:
+            chars[i] = " "
+        for i, c in changes.items():
+            chars[i] = c
+        normalized = "".join(chars)
+    return normalized, spans
+
 
 def split_into_sentences(text: str) -> list[str]:
     """
     Split the text into sentences.
 
-    If the text contains substrings "<prd>" or "<stop>", they would lead
-    to incorrect splitting because they are used as markers for splitting.
-
     :param text: text to be split into sentences
     :type text: str
 
     :return: list of sentences
     :rtype: list[str]
     """
-    text = " " + text + "  "
-    text = text.replace("\n"," ")
-    text = re.sub(prefixes,"\\1<prd>",text)
-    text = re.sub(websites,"<prd>\\1",text)
-    text = re.sub(digits + "[.]" + digits,"\\1<prd>\\2",text)
-    text = re.sub(multiple_dots, lambda match: "<prd>" * len(match.group(0)) + "<stop>", text)
-    if "Ph.D" in text: text = text.replace("Ph.D.","Ph<prd>D<prd>")
-    text = re.sub("\s" + alphabets + "[.] "," \\1<prd> ",text)
-    text = re.sub(acronyms+" "+starters,"\\1<stop> \\2",text)
-    text = re.sub(alphabets + "[.]" + alphabets + "[.]" + alphabets + "[.]","\\1<prd>\\2<prd>\\3<prd>",text)
-    text = re.sub(alphabets + "[.]" + alphabets + "[.]","\\1<prd>\\2<prd>",text)
-    text = re.sub(" "+suffixes+"[.] "+starters," \\1<stop> \\2",text)
-    text = re.sub(" "+suffixes+"[.]"," \\1<prd>",text)
-    text = re.sub(" " + alphabets + "[.]"," \\1<prd>",text)
-    if "”" in text: text = text.replace(".”","”.")
-    if "\"" in text: text = text.replace(".\"","\".")
-    if "!" in text: text = text.replace("!\"","\"!")
-    if "?" in text: text = text.replace("?\"","\"?")
-    text = text.replace(".",".<stop>")
-    text = text.replace("?","?<stop>")
-    text = text.replace("!","!<stop>")
-    text = text.replace("<prd>",".")
-    sentences = text.split("<stop>")
-    sentences = [s.strip() for s in sentences]
-    if sentences and not sentences[-1]: sentences = sentences[:-1]
-    return sentences
\ No newline at end of file
+    normalized, spans = _sentence_bounds(text)
+    if normalized is None:
+        normalized = " " + text.replace("\n", " ") + "  " if "\n" in text else " " + text
+    return [normalized[start:end] for start, end in spans]
@@ -0,0 +1,46 @@
+class Pipeline():
+    """Transforms a nested structure of dicts & lists in a single traversal: the `leaf` functions are applied to every
+       string (one after another), the `node` functions to every dict, list and tuple once its children are done.
+       Other leaves (ints, bools, dates, ...) are kept as they are. Containers are only copied if something in them
+       changed, so unchanged subtrees are shared with the input - treat the result as read-only, like the input.
+       Node functions get the (already transformed) container and return it or a new one, without modifying it."""
+
+    def __init__(self, leaf=(), node=()):
+        self.leaf = tuple(leaf)
+        self.node = tuple(node)
+
+    def __eq__(self, other):
+        return isinstance(other, Pipeline) and (self.leaf, self.node) == (other.leaf, other.node)
+
+    def __hash__(self):  # (such that it can be part of cache-keys)
+        return hash((self.leaf, self.node))
+
+    def __add__(self, other):
+        return Pipeline(self.leaf + other.leaf, self.node + other.node)
+
+    def __call__(self, obj):
+        return self._visit(obj) if self.leaf or self.node else obj
+
+    def _visit(self, obj):
+        if isinstance(obj, str):
+            for fn in self.leaf:
+                obj = fn(obj)
+            return obj
+        if isinstance(obj, dict):
+            new = None
+            for k, v in obj.items():
+                if (nv := self._visit(v)) is not v:
+                    if new is None:
+                        new = dict(obj)
+                    new[k] = nv
+            if new is not None:
+                obj = new
+        elif isinstance(obj, (list, tuple)):
+            new = [self._visit(v) for v in obj]
+            if any(nv is not v for nv, v in zip(new, obj)):
+                obj = new if isinstance(obj, list) else tuple(new)
+        else:
+            return obj
+        for fn in self.node:
+            obj = fn(obj)
+        return obj
@@ -0,0 +1,129 @@
+import os
+import queue
+import threading
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog is optional, without it the files are polled
+    Observer = None
+
+
+def is_temporary(path):
+    """editor swap-files, backups & hidden files (eg. `.cv.yaml.swp`, `cv.yaml~`, `.linkcheck.json`)"""
+    name = os.path.basename(path)
+    return name.startswith(".") or name.endswith(("~", ".swp", ".tmp"))
+
+
+class Watcher():
+    """Calls `callback(changed_paths)` in a background thread whenever some of the watched files (or files inside the
+       watched directories) changed. Uses watchdog (inotify & co) if installed and polls every `poll_interval` seconds
+       otherwise. Events are debounced by `delay` seconds, as editors often write a file in several steps."""
+
+    def __init__(self, paths, callback, delay=0.3, poll_interval=1.0):
+        paths = [os.path.abspath(i) for i in paths if os.path.exists(i)]
+        self.files = {i for i in paths if os.path.isfile(i)}
+        self.dirs = [i for i in paths if os.path.isdir(i)]
+        self.callback = callback
+        self.delay = delay
+        self.poll_interval = poll_interval
+        self._pending = set()
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._observer = None
+
+    def is_watched(self, path):
+        return not is_temporary(path) and (path in self.files or any(path.startswith(i + os.sep) for i in self.dirs))
+
+    def notify(self, path):
+        if path and self.is_watched(path := os.path.abspath(path)):
+            with self._cond:
+                self._pending.add(path)
+                self._cond.notify()
+
+    def start(self):
+        if Observer is not None:
+            self._observer = Observer()
+            handler = FileSystemEventHandler()
+            handler.on_any_event = lambda event: [self.notify(os.fsdecode(i)) for i in (event.src_path, getattr(event, "dest_path", None)) if i]
+            for path in {os.path.dirname(i) for i in self.files}:  # (editors often replace files, so watch their dirs)
+                self._observer.schedule(handler, path, recursive=False)
+            for path in self.dirs:
+                self._observer.schedule(handler, path, recursive=True)
+            self._observer.start()
+        else:
+            threading.Thread(target=self._poll, daemon=True, name="watcher-poll").start()
+        threading.Thread(target=self._debounce, daemon=True, name="watcher").start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        with self._cond:
+            self._cond.notify()
+        if self._observer is not None:
+            self._observer.stop()
+
+    def _snapshot(self):
+        paths = set(self.files) | {os.path.join(root, fname) for path in self.dirs for root, _, fnames in os.walk(path) for fname in fnames}
+        snapshot = {}
+        for path in paths:
+            try:
+                st = os.stat(path)
+                snapshot[path] = (st.st_mtime_ns, st.st_size)
+            except OSError:  # deleted in the meantime
+                pass
+        return snapshot
+
+    def _poll(self):
+        before = self._snapshot()
+        while not self._stopped.wait(self.poll_interval):
+            after = self._snapshot()
+            for path in before.keys() | after.keys():
+                if before.get(path) != after.get(path):
+                    self.notify(path)
+            before = after
+
+    def _debounce(self):
+        while not self._stopped.is_set():
+            with self._cond:
+                while not self._pending and not self._stopped.is_set():
+                    self._cond.wait()
+                # wait until nothing happened for `delay` seconds
+                count = -1
+                while count != len(self._pending) and not self._stopped.is_set():
+                    count = len(self._pending)
+                    self._cond.wait(self.delay)
+                changed, self._pending = self._pending, set()
+            if changed and not self._stopped.is_set():
+                self.callback(changed)
+
+
+class Broadcaster():
+    """Sends messages to all subscribers, eg. one queue per open server-sent-events connection."""
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self._queues = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self.maxsize)
+        with self._lock:
+            self._queues.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._queues.discard(q)
+
+    def publish(self, message):
+        with self._lock:
+            queues = list(self._queues)
+        for q in queues:
+            try:
+                q.put_nowait(message)
+            except queue.Full:  # a client that doesn't read anymore, it'll be unsubscribed once its connection breaks
+                pass
+
+    def __len__(self):
+        return len(self._queues)